@@ -0,0 +1 @@
+"""Noverde Challenge Benchmarks."""
@@ -0,0 +1,63 @@
+"""Cold Start Benchmark.
+
+Import each handler module in a fresh interpreter with
+`python -X importtime` and compare the cumulative import time
+against his budget. Exit with status 1 if any handler is over budget.
+
+Usage::
+
+    python -m benchmarks.cold_start
+
+"""
+import re
+import subprocess
+import sys
+from typing import Dict
+
+HANDLER_BUDGETS_MS: Dict[str, float] = {
+    "noverde_challenge.handlers.loan": 300.0,
+    "noverde_challenge.handlers.analysis": 300.0,
+}
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)\s*$")
+
+
+def measure_import_time(module: str) -> float:
+    """Measure module cumulative import time.
+
+    :param module: Python module path
+    :return: milliseconds
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    for line in output.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(2) == module:
+            return int(match.group(1)) / 1000
+    raise ValueError(f"Import time for {module} not found.")
+
+
+def main() -> int:
+    """Run Cold Start Benchmark.
+
+    :return: exit status
+    """
+    status = 0
+    for module, budget in HANDLER_BUDGETS_MS.items():
+        elapsed = measure_import_time(module)
+        over_budget = elapsed > budget
+        print(
+            f"{module}: {elapsed:.1f} ms (budget {budget:.0f} ms)"
+            f"{' OVER BUDGET' if over_budget else ''}"
+        )
+        if over_budget:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Loan Serialization Benchmark.
+
+Compare the GET Loan response serialization paths:
+
+    * legacy: new Schema per request, dumps, loads and dumps again
+    * direct: shared Schema instance, encoded once
+
+Usage::
+
+    python -m benchmarks.serialize_loan
+
+"""
+import json
+import sys
+import timeit
+
+from noverde_challenge.models.loan import LoanModel
+from noverde_challenge.schemas.loan import RetrieveLoanModelSchema, get_schema
+
+NUMBER = 10000
+
+LOAN = LoanModel(
+    loan_id="873649aa085141fe9a426ca6d29ac3d2",
+    amount=3000.00,
+    cpf="07724426067",
+    birthdate="1923-09-02",
+    terms=9,
+    name="Seu Madruga",
+    income=1500.00,
+    status="completed",
+    result="approved",
+    allowed_amount=369.0,
+    allowed_terms=9,
+)
+
+
+def legacy_path() -> str:
+    """Serialize Loan as the previous GET handler.
+
+    :return: JSON body
+    """
+    return json.dumps(json.loads(RetrieveLoanModelSchema().dumps(LOAN)))
+
+
+def direct_path() -> str:
+    """Serialize Loan with the shared Schema, once.
+
+    :return: JSON body
+    """
+    return get_schema(RetrieveLoanModelSchema).dumps(LOAN)
+
+
+def main() -> int:
+    """Run Loan Serialization Benchmark.
+
+    :return: exit status
+    """
+    assert json.loads(legacy_path()) == json.loads(direct_path())
+    results = {
+        name: timeit.timeit(path, number=NUMBER) / NUMBER * 1_000_000
+        for name, path in (("legacy", legacy_path), ("direct", direct_path))
+    }
+    for name, elapsed in results.items():
+        print(f"{name}: {elapsed:.1f} us per response")
+    print(f"speedup: {results['legacy'] / results['direct']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
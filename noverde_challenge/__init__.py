@@ -1,8 +1,8 @@
-"""Noverde Challenge Package."""
-from noverde_challenge.utils.debug import set_remote_debug
-from noverde_challenge.utils.sentry import configure_sentry
+"""Noverde Challenge Package.
 
-__version__ = "0.1.0"
+Importing the package must stay cheap: Lambda cold starts pay for
+every module loaded here. Runtime setup (Sentry, remote debug)
+runs on handler configuration, see `noverde_challenge.utils.runtime`.
 
-set_remote_debug()
-configure_sentry()
+"""
+__version__ = "0.1.0"
@@ -1,11 +1,10 @@
 """Loan Analysis State Machine Handlers."""
-from typing import Any, Dict, Type, Union
+from typing import Any, Dict, Optional
 
 from loguru import logger
 
 from noverde_challenge.models.loan import LoanModel, LoanRefusedPolicy
 from noverde_challenge.policies.stakeholders import StakeholderBasePolicy
-from noverde_challenge.policies.stakeholders.noverde import NoverdePolicy
 from noverde_challenge.utils.handler_task import handler_task
 
 
@@ -14,18 +13,18 @@ def run_age_policy(
     event: Dict[str, Any],
     context: object,
     loan: LoanModel,
-    policy_class: Union[Type[NoverdePolicy], Type[StakeholderBasePolicy]],
+    policy: StakeholderBasePolicy,
 ) -> bool:
     """Run Age Policy Handler.
 
     :param event: Serverless event instance
     :param context: Serverless context instance
     :param loan: Loan Model instance
-    :param policy_class: StakeholderBasePolicy subclass
+    :param policy: StakeholderBasePolicy instance
     :return: bool
     """
     logger.info(f"Start Run Age Policy for {loan.loan_id}")
-    return policy_class(loan=loan).run_age_policy()  # type: ignore
+    return policy.run_age_policy()
 
 
 @handler_task(refused_policy=LoanRefusedPolicy.SCORE)
@@ -33,18 +32,18 @@ def run_score_policy(
     event: Dict[str, Any],
     context: object,
     loan: LoanModel,
-    policy_class: Union[Type[NoverdePolicy], Type[StakeholderBasePolicy]],
+    policy: StakeholderBasePolicy,
 ) -> bool:
     """Run Score Policy Handler.
 
     :param event: Serverless event instance
     :param context: Serverless context instance
     :param loan: Loan Model instance
-    :param policy_class: StakeholderBasePolicy subclass
+    :param policy: StakeholderBasePolicy instance
     :return: bool
     """
     logger.info(f"Start Run Score Policy for {loan.loan_id}")
-    return policy_class(loan=loan).run_score_policy()  # type: ignore
+    return policy.run_score_policy()
 
 
 @handler_task(refused_policy=LoanRefusedPolicy.COMMITMENT)
@@ -52,15 +51,37 @@ def run_commitment_policy(
     event: Dict[str, Any],
     context: object,
     loan: LoanModel,
-    policy_class: Union[Type[NoverdePolicy], Type[StakeholderBasePolicy]],
+    policy: StakeholderBasePolicy,
 ) -> bool:
     """Run Commitment Policy Handler.
 
     :param event: Serverless event instance
     :param context: Serverless context instance
     :param loan: Loan Model instance
-    :param policy_class: StakeholderBasePolicy subclass
+    :param policy: StakeholderBasePolicy instance
     :return: bool
     """
     logger.info(f"Start Run Commitment Policy for {loan.loan_id}")
-    return policy_class(loan=loan).run_commitment_policy()  # type: ignore
+    return policy.run_commitment_policy()
+
+
+@handler_task()
+def analyze_loan(
+    event: Dict[str, Any],
+    context: object,
+    loan: LoanModel,
+    policy: StakeholderBasePolicy,
+) -> Optional[LoanRefusedPolicy]:
+    """Run all Analysis Policies Handler.
+
+    Run Age, Score and Commitment policies in a single invocation,
+    stopping on first refused policy.
+
+    :param event: Serverless event instance
+    :param context: Serverless context instance
+    :param loan: Loan Model instance
+    :param policy: StakeholderBasePolicy instance
+    :return: Refused policy or None
+    """
+    logger.info(f"Start Analyze Loan for {loan.loan_id}")
+    return policy.run_analysis()
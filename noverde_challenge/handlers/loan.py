@@ -1,25 +1,230 @@
 """Hello Handlers."""
+import hashlib
 import json
+import math
 import os
-from typing import Any, Dict
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
-import boto3
 from loguru import logger
+from marshmallow import ValidationError
 from pynamodb.exceptions import DoesNotExist
 
-from noverde_challenge.models.loan import LoanModel
+from noverde_challenge.models.idempotency import IdempotencyKeyModel
+from noverde_challenge.models.loan import (
+    LoanAnalysisResult,
+    LoanAnalysisStatus,
+    LoanModel,
+    LoanRefusedPolicy,
+)
+from noverde_challenge.policies.stakeholders.noverde import NoverdePolicy
 from noverde_challenge.schemas.loan import (
-    CreateLoanModelSchema,
+    BuildLoanModelSchema,
     RetrieveLoanModelSchema,
+    TraceLoanModelSchema,
+    get_schema,
+)
+from noverde_challenge.utils.aws import get_client
+from noverde_challenge.utils.cache import TTLCache
+from noverde_challenge.utils.exceptions import ConfigurationError
+from noverde_challenge.utils.executor import get_executor
+from noverde_challenge.utils.handler_view import (
+    handler_view,
+    request_header,
+    validation_errors,
 )
-from noverde_challenge.utils.handler_view import handler_view
+from noverde_challenge.utils.helpers import is_valid_cpf, only_numbers
 from noverde_challenge.utils.status_code import StatusCode
 
+LOAN_BATCH_MAX_SIZE = int(os.getenv("LOAN_BATCH_MAX_SIZE", 500))
+LOAN_LOOKUP_MAX_SIZE = int(os.getenv("LOAN_LOOKUP_MAX_SIZE", 1000))
+COMPLETED_LOAN_MAX_AGE = int(os.getenv("COMPLETED_LOAN_MAX_AGE", 86400))
+LOAN_WAIT_MAX_SECONDS = float(os.getenv("LOAN_WAIT_MAX_SECONDS", 20))
+LOAN_WAIT_SAFETY_MARGIN = 1.0
+LOAN_DUPLICATE_WINDOW_SECONDS = float(os.getenv("LOAN_DUPLICATE_WINDOW_SECONDS", 3600))
+LOAN_LIST_MAX_SIZE = int(os.getenv("LOAN_LIST_MAX_SIZE", 20))
+IDEMPOTENCY_KEY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", 86400))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# Keep in progress claims longer than CreateLoan Lambda timeout.
+IDEMPOTENCY_KEY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_KEY_LOCK_SECONDS", 60))
 
-@handler_view()
+
+def parse_policies(value: str) -> Tuple[LoanRefusedPolicy, ...]:
+    """Parse comma separated Policy names (ex. "age,score").
+
+    :param value: Policy names
+    :return: tuple of LoanRefusedPolicy
+    :raises: ConfigurationError if a name is not a Policy
+    """
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    valid_names = [policy.value for policy in LoanRefusedPolicy]
+    invalid_names = [name for name in names if name not in valid_names]
+    if invalid_names:
+        raise ConfigurationError(
+            f"Invalid policies {invalid_names}. Valid policies are {valid_names}."
+        )
+    return tuple(LoanRefusedPolicy(name) for name in names)
+
+
+def load_pre_screen_policies() -> Tuple[LoanRefusedPolicy, ...]:
+    """Load pre-screen Policies from env LOAN_PRE_SCREEN_POLICIES.
+
+    Pre-screen only anticipates State Machine Policies, so an invalid
+    value disables it (logged as error) instead of failing requests.
+
+    :return: tuple of LoanRefusedPolicy
+    """
+    try:
+        return parse_policies(os.getenv("LOAN_PRE_SCREEN_POLICIES", "age"))
+    except ConfigurationError as error:
+        logger.error(f"LOAN_PRE_SCREEN_POLICIES: {error} Pre-screen is disabled.")
+        return ()
+
+
+# Local policies run when Loan is created. Use an empty value to disable.
+PRE_SCREEN_POLICIES = load_pre_screen_policies()
+
+# Completed Loans never change: keep their encoded response per container.
+completed_loans: TTLCache[str] = TTLCache(
+    maxsize=int(os.getenv("LOAN_CACHE_MAX_SIZE", 1024)),
+    ttl=float(os.getenv("LOAN_CACHE_TTL", 300)),
+)
+
+
+def start_analysis(loan: LoanModel) -> None:
+    """Start Loan Analysis State Machine.
+
+    Execution is named after the Loan (see `execution_name`), which does
+    not prevent duplicated executions on Express State Machines.
+
+    :param loan: Loan Model instance
+    :return: None
+    """
+    client = get_client("stepfunctions")
+    client.start_execution(
+        stateMachineArn=os.getenv("LOAN_ANALYSIS_ARN"),
+        name=execution_name(loan.loan_id),
+        input=json.dumps({"loan_id": loan.loan_id}),
+    )
+
+
+def mark_analysis_error(loan: LoanModel) -> None:
+    """Mark saved Loan whose analysis could not be started.
+
+    Loans with error status are not returned as duplicated
+    applications, so the client can retry. Errors are only logged.
+
+    :param loan: Loan Model instance (saved)
+    :return: None
+    """
+    loan.status = LoanAnalysisStatus.ERROR.value
+    try:
+        loan.save_decision()
+    except Exception as error:
+        logger.error(f"[{loan.loan_id}] Could not mark analysis error: {error}")
+
+
+def pre_screen(loan: LoanModel) -> bool:
+    """Run pre-screen Policies for new Loan.
+
+    Refused Loans are updated as completed, like in State Machine,
+    and do not need an analysis.
+
+    :param loan: Loan Model instance (not saved)
+    :return: True if Loan was refused
+    """
+    if not PRE_SCREEN_POLICIES:
+        return False
+    # Get Stakeholder Policy
+    # For this challenge, it will be fixed (same as State Machine tasks)
+    policy = NoverdePolicy(loan=loan)
+    refused_policy = policy.run_pre_screen(PRE_SCREEN_POLICIES)
+    if refused_policy is None:
+        return False
+    logger.info(f"[{loan.loan_id}] Loan refused in pre-screen: {refused_policy.value}")
+    loan.status = LoanAnalysisStatus.COMPLETED.value
+    loan.result = LoanAnalysisResult.REFUSED.value
+    loan.refused_policy = refused_policy.value
+    return True
+
+
+def execution_name(loan_id: str) -> str:
+    """Return State Machine execution name for Loan.
+
+    Names only identify executions in logs and console: the deployed
+    State Machine is Express, which does not enforce unique names.
+    Duplicated executions are handled by the conditional decision save
+    (see `LoanModel.save_decision`).
+
+    :param loan_id: Loan hash key (uuid4, valid execution name characters)
+    :return: execution name
+    """
+    return f"loan-{loan_id}"
+
+
+def get_wait_seconds(event: Dict[str, Any], context: object) -> float:
+    """Get long-poll wait time from request.
+
+    Value from `?wait=<seconds>` is clamped between zero,
+    LOAN_WAIT_MAX_SECONDS and the Lambda remaining time
+    (minus a safety margin).
+
+    :param event: Serverless Event instance
+    :param context: Serverless Context instance
+    :return: seconds to wait
+    :raises: ValueError if wait is not a number
+    """
+    value = (event.get("queryStringParameters") or {}).get("wait")
+    if value is None:
+        return 0.0
+    wait = float(value)
+    if not math.isfinite(wait):
+        raise ValueError(f"Invalid wait value: {value}")
+    wait = min(max(wait, 0.0), LOAN_WAIT_MAX_SECONDS)
+    get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining_time:
+        remaining = get_remaining_time() / 1000 - LOAN_WAIT_SAFETY_MARGIN
+        wait = min(wait, max(remaining, 0.0))
+    return wait
+
+
+def wait_for_decision(
+    loan: LoanModel, wait: float, initial_delay: float = 0.1, max_delay: float = 1.0
+) -> LoanModel:
+    """Reload Loan until his analysis ends or wait time expires.
+
+    Use consistent reads, with exponential backoff between them.
+
+    :param loan: Loan Model instance
+    :param wait: seconds to wait
+    :param initial_delay: first delay between reads, in seconds
+    :param max_delay: maximum delay between reads, in seconds
+    :return: last read Loan Model instance
+    """
+    deadline = time.monotonic() + wait
+    delay = initial_delay
+    while loan.status == LoanAnalysisStatus.PROCESSING.value:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+        loan = LoanModel.get(hash_key=loan.loan_id, consistent_read=True)
+    return loan
+
+
+@handler_view(etag=True)
 def get(event: Dict[str, Any], context: object) -> Dict[str, object]:
     """Loan Get Handler.
 
+    Completed Loans are served from the container cache
+    and can be cached by clients. Loans still in analysis
+    must be revalidated using their ETag.
+
+    Use `?wait=<seconds>` to hold the request
+    until the Loan analysis ends (long-poll).
+
     :param loan: Loan Model instance
     :param event: Serverless Event instance
     :param context: Serverless Context instance
@@ -27,6 +232,23 @@ def get(event: Dict[str, Any], context: object) -> Dict[str, object]:
     """
     loan_id = event["pathParameters"]["loan_id"]
     logger.info(f"Start Retrieve Loan handler for id {loan_id}")
+    completed_headers = {"Cache-Control": f"max-age={COMPLETED_LOAN_MAX_AGE}"}
+    try:
+        wait = get_wait_seconds(event, context)
+    except ValueError:
+        return {
+            "statusCode": StatusCode.BAD_REQUEST,
+            "body": {"errors": ["wait: Must be a number of seconds."]},
+        }
+
+    loan_response = completed_loans.get(loan_id)
+    if loan_response is not None:
+        return {
+            "statusCode": StatusCode.OK,
+            "body": loan_response,
+            "headers": completed_headers,
+        }
+
     try:
         loan = LoanModel.get(hash_key=loan_id)
     except DoesNotExist:
@@ -34,28 +256,326 @@ def get(event: Dict[str, Any], context: object) -> Dict[str, object]:
             "statusCode": StatusCode.NOT_FOUND,
             "body": {"errors": [f"LoanId {loan_id} does not found."]},
         }
+    if wait:
+        loan = wait_for_decision(loan, wait)
 
-    loan_response = json.loads(RetrieveLoanModelSchema().dumps(loan))
-    response = {"statusCode": StatusCode.OK, "body": loan_response}
+    # Body is encoded once here, handler_view will not encode it again.
+    loan_response = get_schema(RetrieveLoanModelSchema).dumps(loan)
+    if loan.status == LoanAnalysisStatus.COMPLETED.value:
+        completed_loans.set(loan_id, loan_response)
+        headers = completed_headers
+    else:
+        headers = {"Cache-Control": "no-cache"}
+    response = {"statusCode": StatusCode.OK, "body": loan_response, "headers": headers}
 
     return response
 
 
-@handler_view(model_schema=CreateLoanModelSchema)
-def post(event: Dict[str, Any], context: object, loan: LoanModel) -> Dict[str, object]:
+@handler_view()
+def get_trace(event: Dict[str, Any], context: object) -> Dict[str, object]:
+    """Loan Decision Trace Handler.
+
+    Return Loan with his Analysis decision trace (policies inputs
+    and outputs, ex. score, CFV, chosen rate and PMT), to debug
+    slow or unexpected analysis.
+
+    Trace has Borrower credit data, so this endpoint is internal only
+    (IAM auth, see serverless.yml).
+
+    :param event: Serverless Event instance
+    :param context: Serverless Context instance
+    :return: Dict
+    """
+    loan_id = event["pathParameters"]["loan_id"]
+    logger.info(f"Start Retrieve Loan Trace handler for id {loan_id}")
+    try:
+        loan = LoanModel.get(hash_key=loan_id, consistent_read=True)
+    except DoesNotExist:
+        return {
+            "statusCode": StatusCode.NOT_FOUND,
+            "body": {"errors": [f"LoanId {loan_id} does not found."]},
+        }
+    return {
+        "statusCode": StatusCode.OK,
+        "body": get_schema(TraceLoanModelSchema).dump(loan),
+        "headers": {"Cache-Control": "no-store"},
+    }
+
+
+@handler_view(
+    model_schema=BuildLoanModelSchema, clients=("stepfunctions",), pass_body=True
+)
+def post(
+    event: Dict[str, Any], context: object, loan: LoanModel, data: Dict[str, Any]
+) -> Dict[str, object]:
     """Loan Post Handler.
 
+    Requests with an `Idempotency-Key` header are processed once:
+    retries with the same key and body return the first response,
+    without any write or State Machine execution. The same key
+    with another body, or while the first request is in progress,
+    returns 409 Conflict.
+
+    If the same application (same Borrower and Loan data) is in
+    analysis or was created in the last LOAN_DUPLICATE_WINDOW_SECONDS,
+    return the existing Loan id instead of starting a new analysis.
+    Set window to zero to disable this check.
+
+    Loans refused by pre-screen Policies (LOAN_PRE_SCREEN_POLICIES)
+    are saved as completed, without starting an analysis.
+
     :param event: Serverless Event Instance
     :param context: Serverless Context instance
-    :param loan: Loan Model instance
+    :param loan: Loan Model instance (not saved)
+    :param data: decoded request body
     :return: Dict
     """
     logger.info(f"Starting Create Loan handler...")
-    body = {"id": loan.loan_id}
+    idempotency_key = request_header(event, "Idempotency-Key")
+    record = None
+    if idempotency_key is not None:
+        if not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+            return {
+                "statusCode": StatusCode.BAD_REQUEST,
+                "body": {
+                    "errors": [
+                        f"Idempotency-Key: Must have 1 to "
+                        f"{IDEMPOTENCY_KEY_MAX_LENGTH} characters."
+                    ]
+                },
+            }
+        request_hash = hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode()
+        ).hexdigest()
+        record = IdempotencyKeyModel(
+            key=idempotency_key,
+            request_hash=request_hash,
+            expires_at=timedelta(seconds=IDEMPOTENCY_KEY_TTL_SECONDS),
+        )
+        existing = record.claim(IDEMPOTENCY_KEY_LOCK_SECONDS)
+        if existing:
+            if existing.request_hash != request_hash:
+                return {
+                    "statusCode": StatusCode.CONFLICT,
+                    "body": {
+                        "errors": [
+                            "Idempotency-Key: Already used with another request."
+                        ]
+                    },
+                }
+            if existing.in_progress:
+                return {
+                    "statusCode": StatusCode.CONFLICT,
+                    "body": {
+                        "errors": ["Idempotency-Key: Request in progress, retry later."]
+                    },
+                    "headers": {"Retry-After": "1"},
+                }
+            logger.info(f"Replaying response for Loan {existing.loan_id}")
+            return {
+                "statusCode": StatusCode(existing.status_code),
+                "body": {"id": existing.loan_id},
+            }
 
-    client = boto3.client("stepfunctions")
-    client.start_execution(
-        stateMachineArn=os.getenv("LOAN_ANALYSIS_ARN"),
-        input=json.dumps({"loan_id": loan.loan_id}),
+    try:
+        if LOAN_DUPLICATE_WINDOW_SECONDS > 0:
+            duplicate = loan.find_duplicate(LOAN_DUPLICATE_WINDOW_SECONDS)
+            if duplicate:
+                logger.info(f"Same application found in Loan {duplicate.loan_id}")
+                if record:
+                    record.complete(duplicate.loan_id, StatusCode.OK.value)
+                return {"statusCode": StatusCode.OK, "body": {"id": duplicate.loan_id}}
+
+        refused = pre_screen(loan)
+        loan.save_new()
+        if not refused:
+            try:
+                start_analysis(loan)
+            except Exception:
+                mark_analysis_error(loan)
+                raise
+    except Exception:
+        # Release the key, so the client can retry this request.
+        if record:
+            record.delete()
+        raise
+
+    if record:
+        try:
+            record.complete(loan.loan_id, StatusCode.CREATED.value)
+        except Exception as error:
+            # Loan is created: retries after the claim lock are
+            # answered by the duplicated application check.
+            logger.error(f"Could not complete Idempotency-Key: {error}")
+
+    return {"statusCode": StatusCode.CREATED, "body": {"id": loan.loan_id}}
+
+
+@handler_view()
+def list_by_cpf(event: Dict[str, Any], context: object) -> Dict[str, object]:
+    """Loan List Handler.
+
+    List newest Loans for Borrower CPF (`?cpf=<cpf>`),
+    using the CPF index.
+
+    Response has Borrower personal data and credit decisions,
+    so this endpoint is internal only (IAM auth, see serverless.yml).
+
+    :param event: Serverless Event Instance
+    :param context: Serverless Context instance
+    :return: Dict
+    """
+    cpf = only_numbers((event.get("queryStringParameters") or {}).get("cpf") or "")
+    if not is_valid_cpf(cpf):
+        return {
+            "statusCode": StatusCode.BAD_REQUEST,
+            "body": {"errors": ["cpf: Invalid CPF number."]},
+        }
+    logger.info(f"Start List Loan handler")
+    loans = LoanModel.find_by_cpf(cpf, limit=LOAN_LIST_MAX_SIZE)
+    body = {"loans": get_schema(RetrieveLoanModelSchema).dump(loans, many=True)}
+    return {"statusCode": StatusCode.OK, "body": body}
+
+
+def start_analysis_safe(loan: LoanModel) -> Optional[str]:
+    """Start Loan Analysis, returning the error instead of raising it.
+
+    Loan is marked with error status if analysis could not be started.
+
+    :param loan: Loan Model instance
+    :return: error message or None
+    """
+    try:
+        start_analysis(loan)
+    except Exception as error:
+        logger.error(f"Could not start analysis for Loan {loan.loan_id}: {error}")
+        mark_analysis_error(loan)
+        return str(error)
+    return None
+
+
+@handler_view(clients=("stepfunctions",), pass_body=True)
+def post_batch(event: Dict[str, Any], context: object, data: Any) -> Dict[str, object]:
+    """Loan Batch Post Handler.
+
+    Validate all Loans, save the valid ones with BatchWriteItem
+    and start their analysis concurrently.
+    Loans refused by pre-screen Policies are saved as completed.
+
+    Saved Loans are reported in "loans" and errors (validation,
+    save or analysis) in "errors", per item, using his index in request.
+    "ids" has all saved Loan ids, in request order.
+
+    :param event: Serverless Event Instance
+    :param context: Serverless Context instance
+    :param data: decoded request body (list of Loans)
+    :return: Dict
+    """
+    logger.info(f"Starting Create Loan Batch handler...")
+    if not isinstance(data, list) or not data:
+        return {
+            "statusCode": StatusCode.BAD_REQUEST,
+            "body": {"errors": ["Request body must be a non empty list of Loans."]},
+        }
+    if len(data) > LOAN_BATCH_MAX_SIZE:
+        return {
+            "statusCode": StatusCode.BAD_REQUEST,
+            "body": {
+                "errors": [f"Batch size must be up to {LOAN_BATCH_MAX_SIZE} Loans."]
+            },
+        }
+
+    schema = get_schema(BuildLoanModelSchema)
+    loans: List[LoanModel] = []
+    indexes: List[int] = []
+    errors: List[Dict[str, Any]] = []
+    for index, item in enumerate(data):
+        if isinstance(item, dict) and "id" in item:
+            # Batch writes can not be conditioned: never accept client ids.
+            errors.append(
+                {"index": index, "errors": ["id: Loan ids are generated by server."]}
+            )
+            continue
+        try:
+            loans.append(schema.load(item))
+            indexes.append(index)
+        except ValidationError as error:
+            errors.append({"index": index, "errors": validation_errors(error.messages)})
+
+    if not loans:
+        return {"statusCode": StatusCode.BAD_REQUEST, "body": {"errors": errors}}
+
+    refused = {loan.loan_id for loan in loans if pre_screen(loan)}
+    save_errors = LoanModel.save_new_batch(loans)
+    saved = []
+    for index, loan in zip(indexes, loans):
+        if loan.loan_id in save_errors:
+            errors.append(
+                {"index": index, "errors": [f"save: {save_errors[loan.loan_id]}"]}
+            )
+        else:
+            saved.append((index, loan))
+    if not saved:
+        return {
+            "statusCode": StatusCode.INTERNAL_ERROR,
+            "body": {"errors": sorted(errors, key=lambda item: item["index"])},
+        }
+
+    pending = [(index, loan) for index, loan in saved if loan.loan_id not in refused]
+    logger.info(f"{len(saved)} Loans saved. Starting {len(pending)} analysis...")
+
+    analysis_errors = get_executor().map(
+        start_analysis_safe, [loan for _, loan in pending]
     )
+    for (index, _), analysis_error in zip(pending, analysis_errors):
+        if analysis_error:
+            errors.append({"index": index, "errors": [f"analysis: {analysis_error}"]})
+
+    body = {
+        "ids": [loan.loan_id for _, loan in saved],
+        "loans": [{"index": index, "id": loan.loan_id} for index, loan in saved],
+        "errors": sorted(errors, key=lambda item: item["index"]),
+    }
     return {"statusCode": StatusCode.CREATED, "body": body}
+
+
+@handler_view(pass_body=True)
+def lookup(event: Dict[str, Any], context: object, data: Any) -> Dict[str, object]:
+    """Loan Lookup Handler.
+
+    Retrieve several Loans at once, using BatchGetItem
+    with only the attributes exposed in Retrieve Schema.
+
+    :param event: Serverless Event Instance
+    :param context: Serverless Context instance
+    :param data: decoded request body ({"ids": [...]})
+    :return: Dict
+    """
+    loan_ids = data.get("ids") if isinstance(data, dict) else None
+    if (
+        not isinstance(loan_ids, list)
+        or not loan_ids
+        or not all(isinstance(loan_id, str) and loan_id for loan_id in loan_ids)
+    ):
+        return {
+            "statusCode": StatusCode.BAD_REQUEST,
+            "body": {"errors": ["ids: Must be a non empty list of Loan ids."]},
+        }
+    if len(loan_ids) > LOAN_LOOKUP_MAX_SIZE:
+        return {
+            "statusCode": StatusCode.BAD_REQUEST,
+            "body": {"errors": [f"ids: Must have up to {LOAN_LOOKUP_MAX_SIZE} ids."]},
+        }
+    logger.info(f"Start Lookup Loan handler for {len(loan_ids)} ids")
+
+    schema = get_schema(RetrieveLoanModelSchema)
+    loans = LoanModel.get_many(loan_ids, attributes_to_get=schema.projection)
+    requested_ids = list(dict.fromkeys(loan_ids))
+    body = {
+        "loans": schema.dump(
+            [loans[loan_id] for loan_id in requested_ids if loan_id in loans],
+            many=True,
+        ),
+        "missing": [loan_id for loan_id in requested_ids if loan_id not in loans],
+    }
+    return {"statusCode": StatusCode.OK, "body": body}
@@ -0,0 +1,20 @@
+"""Base Model Module."""
+import os
+
+
+class DynamoDBMeta:
+    """Shared Models Meta class.
+
+    Connection settings for every table, configured using env:
+
+        * DYNAMODB_MAX_POOL_CONNECTIONS: Max connections kept alive (default: 10)
+        * DYNAMODB_MAX_RETRY_ATTEMPTS: Max retries per request (default: 3)
+        * DYNAMODB_CONNECT_TIMEOUT: Connect timeout in seconds (default: 2)
+        * DYNAMODB_READ_TIMEOUT: Read timeout in seconds (default: 5)
+
+    """
+
+    max_pool_connections = int(os.getenv("DYNAMODB_MAX_POOL_CONNECTIONS", 10))
+    max_retry_attempts = int(os.getenv("DYNAMODB_MAX_RETRY_ATTEMPTS", 3))
+    connect_timeout_seconds = int(os.getenv("DYNAMODB_CONNECT_TIMEOUT", 2))
+    read_timeout_seconds = int(os.getenv("DYNAMODB_READ_TIMEOUT", 5))
@@ -0,0 +1,95 @@
+"""Idempotency Key Model Module.
+
+Store the Idempotency-Key sent in Loan creation requests,
+so client and API Gateway retries return the original response
+instead of creating a new Loan.
+Keys expire using DynamoDB Time To Live.
+
+A key is claimed "in progress" (without response) and completed
+only after the Loan is saved and his analysis is started.
+
+
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from pynamodb.attributes import NumberAttribute, TTLAttribute, UnicodeAttribute
+from pynamodb.exceptions import PutError
+from pynamodb.models import Model
+
+from noverde_challenge.models.base import DynamoDBMeta
+
+
+class IdempotencyKeyModel(Model):
+    """Idempotency Key Model.
+
+    Attributes
+        * key (string): Idempotency-Key header value (hash key)
+        * request_hash (string): SHA-256 of the request body
+        * claimed_at (number): Claim time (epoch seconds)
+        * loan_id (string): Loan id of the first response, once completed
+        * status_code (number): Status code of the first response, once completed
+        * expires_at (ttl): Key expiration time
+
+    """
+
+    key = UnicodeAttribute(hash_key=True)
+    request_hash = UnicodeAttribute()
+    claimed_at = NumberAttribute(default=time.time)
+    loan_id = UnicodeAttribute(null=True)
+    status_code = NumberAttribute(null=True)
+    expires_at = TTLAttribute()
+
+    class Meta(DynamoDBMeta):
+        """Schema Meta class."""
+
+        table_name = os.getenv("IDEMPOTENCY_TABLE")
+
+    @property
+    def in_progress(self) -> bool:
+        """Return if first request is still running (no response yet)."""
+        return self.status_code is None
+
+    def claim(self, lock_seconds: float) -> Optional["IdempotencyKeyModel"]:
+        """Claim Idempotency Key for a new request.
+
+        Do a PutItem conditioned to key does not exist, to be expired
+        (DynamoDB TTL deletes expired items only within days), or to be
+        in progress for more than `lock_seconds` (abandoned claim,
+        ex. Lambda timeout).
+
+        :param lock_seconds: time to keep an in progress claim, in seconds
+        :return: None if key was claimed, else the existing Idempotency Key
+        """
+        model = IdempotencyKeyModel
+        condition = (
+            model.key.does_not_exist()
+            | (model.expires_at < datetime.now(timezone.utc))
+            | (
+                model.status_code.does_not_exist()
+                & (model.claimed_at < time.time() - lock_seconds)
+            )
+        )
+        try:
+            self.save(condition=condition)
+        except PutError as error:
+            if error.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            return self.get(hash_key=self.key, consistent_read=True)
+        return None
+
+    def complete(self, loan_id: str, status_code: int) -> None:
+        """Store first response for claimed Idempotency Key.
+
+        :param loan_id: Loan id returned
+        :param status_code: Status code returned
+        :return: None
+        """
+        self.update(
+            actions=[
+                IdempotencyKeyModel.loan_id.set(loan_id),
+                IdempotencyKeyModel.status_code.set(status_code),
+            ]
+        )
@@ -8,11 +8,28 @@ https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/bp-general-nosq
 
 """
 import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from enum import Enum, unique
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
 
-from pynamodb.attributes import NumberAttribute, UnicodeAttribute
+from loguru import logger
+from pynamodb.attributes import (
+    JSONAttribute,
+    NumberAttribute,
+    UnicodeAttribute,
+    VersionAttribute,
+)
+from pynamodb.exceptions import PutError
+from pynamodb.indexes import AllProjection, GlobalSecondaryIndex
 from pynamodb.models import Model
 
+from noverde_challenge.models.base import DynamoDBMeta
+from noverde_challenge.utils.exceptions import TableNotFoundError
+
+# DynamoDB limit for BatchWriteItem requests
+BATCH_WRITE_MAX_ITEMS = 25
+
 
 @unique
 class LoanAnalysisStatus(Enum):
@@ -40,12 +57,37 @@ class LoanRefusedPolicy(Enum):
     COMMITMENT = "commitment"
 
 
+def utc_timestamp(delta: Optional[timedelta] = None) -> str:
+    """Return current UTC time as a sortable ISO string.
+
+    :param delta: time shift from now
+    :return: string
+    """
+    now = datetime.now(timezone.utc) + (delta or timedelta())
+    return now.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class CpfIndex(GlobalSecondaryIndex):  # type: ignore
+    """Loans by Borrower CPF, newest last."""
+
+    class Meta:
+        """Index Meta class."""
+
+        index_name = "cpf-index"
+        read_capacity_units = 1
+        write_capacity_units = 1
+        projection = AllProjection()
+
+    cpf = UnicodeAttribute(hash_key=True)
+    created_at = UnicodeAttribute(range_key=True)
+
+
 class LoanModel(Model):
     """Loan Model.
 
     Attributes
         * loan_id (uuid): Loan hash key
-        * cpf (string): Borrower CPF (range key)
+        * cpf (string): Borrower CPF (cpf_index hash key)
         * birthdate (string): Borrower Birthday
         * amount (number): Loan value
         * terms (number): Loan instalments value
@@ -57,6 +99,11 @@ class LoanModel(Model):
         * refused_policy (LoanRefusedPolicy): Loan Refused Policy
         * allowed_amount (number): allowed amount after analysis
         * allowed_terms (number): allowed terms after analysis
+        * decision_trace (json): Policies inputs and outputs
+            (ex. score, commitment, CFV, rate, PMT)
+
+        * created_at (string): Creation UTC time (cpf_index range key)
+        * version (number): Item version, incremented on each save
 
     """
 
@@ -73,8 +120,254 @@ class LoanModel(Model):
     refused_policy = UnicodeAttribute(null=True)
     allowed_amount = NumberAttribute(null=True)
     allowed_terms = NumberAttribute(null=True)
+    decision_trace = JSONAttribute(null=True)
 
-    class Meta:
+    created_at = UnicodeAttribute(default=utc_timestamp)
+    version = VersionAttribute()
+
+    cpf_index = CpfIndex()
+
+    class Meta(DynamoDBMeta):
         """Schema Meta class."""
 
         table_name = os.getenv("DYNAMODB_TABLE")
+
+    _table_verified = False
+
+    @classmethod
+    def ensure_table(cls, create: bool = False) -> None:
+        """Verify Loan table exists, once per process.
+
+        Use this method on startup or migration paths,
+        never inside requests.
+
+        :param create: Create table if does not exist
+        :return: None
+        :raises: TableNotFoundError if table does not exist
+            and create is False
+        """
+        if cls._table_verified:
+            return
+        if not cls.exists():
+            if not create:
+                raise TableNotFoundError(f"Table {cls.Meta.table_name} does not exist.")
+            logger.info(f"Creating table {cls.Meta.table_name}...")
+            cls.create_table(read_capacity_units=1, write_capacity_units=1, wait=True)
+        cls._table_verified = True
+
+    @classmethod
+    @contextmanager
+    def table_required(cls) -> Iterator[None]:
+        """Raise TableNotFoundError for writes on missing table.
+
+        :return: Context Manager
+        :raises: TableNotFoundError if table does not exist
+        """
+        try:
+            yield
+        except PutError as error:
+            if error.cause_response_code != "ResourceNotFoundException":
+                raise
+            raise TableNotFoundError(
+                f"Table {cls.Meta.table_name} does not exist. "
+                f"Please run migrations before create Loans."
+            ) from error
+
+    def save_new(self) -> None:
+        """Save new Loan.
+
+        Do a single PutItem, without checking if table exists.
+
+        :return: None
+        :raises: TableNotFoundError if table does not exist
+        """
+        with self.table_required():
+            self.save()
+
+    @classmethod
+    def save_new_batch(cls, loans: Iterable["LoanModel"]) -> Dict[str, str]:
+        """Save new Loans using BatchWriteItem.
+
+        Loans are sent in chunks of 25 items (DynamoDB limit), and
+        PynamoDB retries unprocessed items with exponential backoff.
+        A failed chunk does not stop the next ones: Loans not saved
+        are returned, so callers can report them per item.
+        Batch writes can not be conditioned, so Loans must have
+        new hash keys.
+
+        :param loans: new Loan Model instances
+        :return: Dict of error message by hash key, for Loans not saved
+        :raises: TableNotFoundError if table does not exist
+        """
+        loans = list(loans)
+        failed: Dict[str, str] = {}
+        for start in range(0, len(loans), BATCH_WRITE_MAX_ITEMS):
+            end = start + BATCH_WRITE_MAX_ITEMS
+            chunk = loans[start:end]
+            try:
+                with cls.table_required(), cls.batch_write() as batch:
+                    for loan in chunk:
+                        # Same initial version set by `save` for new items
+                        loan.version = 1
+                        batch.save(loan)
+            except PutError as error:
+                # Only unprocessed items are known to be not saved,
+                # otherwise the whole request failed.
+                unprocessed = getattr(batch, "failed_operations", None)
+                loan_ids = (
+                    [
+                        item["PutRequest"]["Item"][cls.loan_id.attr_name]["S"]
+                        for item in unprocessed
+                    ]
+                    if unprocessed
+                    else [loan.loan_id for loan in chunk]
+                )
+                logger.error(f"Could not save {len(loan_ids)} Loans: {error}")
+                failed.update((loan_id, str(error)) for loan_id in loan_ids)
+        return failed
+
+    @classmethod
+    def get_many(
+        cls, loan_ids: Iterable[str], attributes_to_get: Optional[Sequence[str]] = None
+    ) -> Dict[str, "LoanModel"]:
+        """Get Loans using BatchGetItem.
+
+        PynamoDB requests keys in pages of 100 and
+        retries unprocessed keys. Duplicated ids are requested once.
+
+        :param loan_ids: Loan hash keys
+        :param attributes_to_get: Attributes projection. Default: all attributes
+        :return: Dict of found Loans by hash key
+        """
+        keys = list(dict.fromkeys(loan_ids))
+        return {
+            loan.loan_id: loan
+            for loan in cls.batch_get(keys, attributes_to_get=attributes_to_get)
+        }
+
+    @classmethod
+    def find_by_cpf(
+        cls, cpf: str, since: Optional[str] = None, limit: Optional[int] = None
+    ) -> Iterator["LoanModel"]:
+        """Find Loans for Borrower CPF, newest first.
+
+        Query the CPF index, without scanning the table.
+
+        :param cpf: Borrower CPF (only numbers)
+        :param since: minimum creation time, from `utc_timestamp`
+        :param limit: maximum Loans returned
+        :return: Loans iterator
+        """
+        range_key_condition = CpfIndex.created_at >= since if since else None
+        return cls.cpf_index.query(
+            cpf,
+            range_key_condition=range_key_condition,
+            scan_index_forward=False,
+            limit=limit,
+        )
+
+    application_attributes = ("name", "birthdate", "amount", "terms", "income")
+
+    def is_same_application(self, other: "LoanModel") -> bool:
+        """Check if other Loan has the same Borrower application data.
+
+        :param other: Loan Model instance
+        :return: Boolean
+        """
+        return self.cpf == other.cpf and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.application_attributes
+        )
+
+    def find_duplicate(self, window_seconds: float) -> Optional["LoanModel"]:
+        """Find same application in analysis or created inside time window.
+
+        :param window_seconds: time window, in seconds
+        :return: existing Loan Model or None
+        """
+        since = utc_timestamp(-timedelta(seconds=window_seconds))
+        for loan in self.find_by_cpf(self.cpf, since=since):
+            if loan.loan_id != self.loan_id and self.is_same_application(loan):
+                if loan.status in (
+                    LoanAnalysisStatus.PROCESSING.value,
+                    LoanAnalysisStatus.COMPLETED.value,
+                ):
+                    return loan
+        return None
+
+    decision_attributes = (
+        "status",
+        "result",
+        "refused_policy",
+        "allowed_amount",
+        "allowed_terms",
+        "decision_trace",
+    )
+
+    def save_decision(self) -> None:
+        """Save Loan Analysis decision.
+
+        Only decision attributes are written, using an UpdateItem
+        conditioned to Loan status still be "processing" (and to item version).
+        Retried or duplicated analysis will fail the condition
+        instead of rewriting the entire item.
+
+        :return: None
+        :raises: UpdateError (ConditionalCheckFailedException) if Loan
+            was already decided or changed
+        """
+        actions = [
+            getattr(LoanModel, name).set(getattr(self, name))
+            for name in self.decision_attributes
+            if getattr(self, name) is not None
+        ]
+        self.update(
+            actions=actions,
+            condition=LoanModel.status == LoanAnalysisStatus.PROCESSING.value,
+        )
+
+    def save_trace(self) -> None:
+        """Save Loan decision trace, while Loan is processing.
+
+        Allow retried analysis steps to reuse recorded values.
+
+        :return: None
+        :raises: UpdateError (ConditionalCheckFailedException) if Loan
+            was already decided or changed
+        """
+        self.update(
+            actions=[LoanModel.decision_trace.set(self.decision_trace)],
+            condition=LoanModel.status == LoanAnalysisStatus.PROCESSING.value,
+        )
+
+    def to_payload(self) -> Dict[str, Any]:
+        """Return Loan attributes for State Machine payloads.
+
+        :return: Dict
+        """
+        return dict(self.attribute_values)
+
+    @classmethod
+    def from_payload(
+        cls, loan_id: str, payload: Optional[Dict[str, Any]]
+    ) -> Optional["LoanModel"]:
+        """Rebuild Loan from State Machine payload.
+
+        Payload is used only if it belongs to the same Loan,
+        and has all required attributes and the item version.
+        Payload freshness is checked by DynamoDB on save,
+        using version attribute.
+
+        :param loan_id: Loan hash key
+        :param payload: Loan attributes from `to_payload`
+        :return: LoanModel or None if payload can not be used
+        """
+        if not payload or payload.get("loan_id") != loan_id:
+            return None
+        attributes = cls.get_attributes()
+        required = [
+            name for name, attribute in attributes.items() if not attribute.null
+        ]
+        if any(payload.get(name) is None for name in required + ["version"]):
+            return None
+        return cls(**{name: payload.get(name) for name in attributes})
@@ -0,0 +1,35 @@
+"""Database Migration Module.
+
+Create DynamoDB tables, if they do not exist.
+In AWS, tables are created by Serverless resources.
+
+Usage::
+
+    $ python -m noverde_challenge.models.migrate
+
+"""
+from loguru import logger
+
+from noverde_challenge.models.idempotency import IdempotencyKeyModel
+from noverde_challenge.models.loan import LoanModel
+
+
+def migrate() -> None:
+    """Create all application tables.
+
+    :return: None
+    """
+    for model in [LoanModel]:
+        model.ensure_table(create=True)
+        logger.info(f"Table {model.Meta.table_name} is ready.")
+
+    # Time To Live is enabled by `create_table`
+    if not IdempotencyKeyModel.exists():
+        IdempotencyKeyModel.create_table(
+            read_capacity_units=1, write_capacity_units=1, wait=True
+        )
+    logger.info(f"Table {IdempotencyKeyModel.Meta.table_name} is ready.")
+
+
+if __name__ == "__main__":
+    migrate()
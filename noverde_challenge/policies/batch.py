@@ -0,0 +1,130 @@
+"""Columnar Loan Set Module.
+
+Used to analyse thousands of Loans at once
+(ex. nightly re-scoring, portfolio what-if runs).
+Each attribute is a Numpy array, one position per Loan.
+
+"""
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from noverde_challenge.models.loan import LoanModel
+
+
+@dataclass
+class LoanBatch:
+    """Columnar Loan Set.
+
+    Attributes
+        * loan_id (ndarray): Loan hash keys
+        * birthdate (ndarray): Borrower birthdays (datetime64[D])
+        * amount (ndarray): Loan values
+        * terms (ndarray): Loan instalments values
+        * income (ndarray): Borrower incomes
+        * score (ndarray): Borrower scores
+        * commitment (ndarray): Borrower commitment rates
+
+    """
+
+    loan_id: Any
+    birthdate: Any
+    amount: Any
+    terms: Any
+    income: Any
+    score: Any
+    commitment: Any
+
+    def __post_init__(self) -> None:
+        """Convert attributes to Numpy arrays."""
+        self.loan_id = np.asarray(self.loan_id, dtype=str)
+        self.birthdate = np.asarray(self.birthdate, dtype="datetime64[D]")
+        self.amount = np.asarray(self.amount, dtype=float)
+        self.terms = np.asarray(self.terms, dtype=int)
+        self.income = np.asarray(self.income, dtype=float)
+        self.score = np.asarray(self.score, dtype=float)
+        self.commitment = np.asarray(self.commitment, dtype=float)
+        sizes = {len(getattr(self, field.name)) for field in fields(self)}
+        if len(sizes) > 1:
+            raise ValueError("All LoanBatch attributes must have the same size.")
+
+    def __len__(self) -> int:
+        """Return Loan count."""
+        return len(self.loan_id)
+
+    @classmethod
+    def from_loans(
+        cls,
+        loans: Iterable[LoanModel],
+        scores: Iterable[float],
+        commitments: Iterable[float],
+    ) -> "LoanBatch":
+        """Create Loan Set from Loan Models.
+
+        :param loans: Loan Model instances
+        :param scores: Borrower score for each Loan
+        :param commitments: Borrower commitment rate for each Loan
+        :return: LoanBatch
+        """
+        loans = list(loans)
+        return cls(
+            loan_id=[loan.loan_id for loan in loans],
+            birthdate=[loan.birthdate for loan in loans],
+            amount=[loan.amount for loan in loans],
+            terms=[loan.terms for loan in loans],
+            income=[loan.income for loan in loans],
+            score=list(scores),
+            commitment=list(commitments),
+        )
+
+
+@dataclass
+class LoanBatchResult:
+    """Columnar Loan Analysis Result.
+
+    Attributes
+        * loan_id (ndarray): Loan hash keys
+        * status (ndarray): Loan Analysis status
+        * result (ndarray): Loan Analysis result
+        * refused_policy (ndarray): Loan Refused Policy or None
+        * allowed_amount (ndarray): allowed amount or NaN
+        * allowed_terms (ndarray): allowed terms or 0
+
+    """
+
+    loan_id: Any
+    status: Any
+    result: Any
+    refused_policy: Any
+    allowed_amount: Any
+    allowed_terms: Any
+
+    def __len__(self) -> int:
+        """Return Loan count."""
+        return len(self.loan_id)
+
+    def to_records(self) -> List[Dict[str, Optional[Any]]]:
+        """Return results as Loan Model attributes dicts.
+
+        :return: List
+        """
+        return [
+            {
+                "loan_id": str(self.loan_id[index]),
+                "status": str(self.status[index]),
+                "result": str(self.result[index]),
+                "refused_policy": self.refused_policy[index],
+                "allowed_amount": (
+                    None
+                    if np.isnan(self.allowed_amount[index])
+                    else float(self.allowed_amount[index])
+                ),
+                "allowed_terms": (
+                    int(self.allowed_terms[index])
+                    if self.allowed_terms[index]
+                    else None
+                ),
+            }
+            for index in range(len(self))
+        ]
@@ -1,13 +1,25 @@
 """Stakeholder Policy Base Class."""
 from abc import ABC, abstractmethod
-from typing import Any, List
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-import numpy as np
-import numpy_financial as npf
-import pandas
 from loguru import logger
 
-from noverde_challenge.models.loan import LoanModel
+from noverde_challenge.models.loan import LoanModel, LoanRefusedPolicy
+
+if TYPE_CHECKING:  # pragma: no cover
+    from noverde_challenge.policies.batch import LoanBatch, LoanBatchResult
+    from noverde_challenge.utils.rates import AvailableRates
 
 
 class StakeholderBasePolicy(ABC):
@@ -33,6 +45,124 @@ class StakeholderBasePolicy(ABC):
     maximum_amount: float
     minimum_score: int
     loan: LoanModel
+    external_values: Dict[str, Union[int, float]]
+    saved_requests: int
+    policy_results: Dict[str, bool]
+    decision_trace: Dict[str, Any]
+
+    # External values recorded in decision trace
+    traced_external_values: Tuple[str, ...] = ()
+
+    analysis_policies: Tuple[LoanRefusedPolicy, ...] = (
+        LoanRefusedPolicy.AGE,
+        LoanRefusedPolicy.SCORE,
+        LoanRefusedPolicy.COMMITMENT,
+    )
+
+    # Policies without external requests, cheap enough to run
+    # inline when Loan is created.
+    local_policies: Tuple[LoanRefusedPolicy, ...] = (LoanRefusedPolicy.AGE,)
+
+    def load_decision_trace(self) -> None:
+        """Reuse decision trace recorded in Loan by previous attempts.
+
+        Recorded external values are used instead of new requests.
+
+        :return: None
+        """
+        self.decision_trace = dict(self.loan.decision_trace or {})
+        self.policy_results = {
+            **self.decision_trace.get("policies", {}),
+            **self.policy_results,
+        }
+        for name in self.traced_external_values:
+            if name in self.decision_trace:
+                self.external_values.setdefault(name, self.decision_trace[name])
+
+    def record(self, policy: LoanRefusedPolicy, result: bool, **values: Any) -> None:
+        """Record Policy result and values in Loan decision trace.
+
+        :param policy: LoanRefusedPolicy enum
+        :param result: Policy result
+        :param values: Policy inputs and outputs (ex. score=700)
+        :return: None
+        """
+        self.policy_results[policy.value] = result
+        self.record_values(policies=dict(self.policy_results), **values)
+
+    def record_values(self, **values: Any) -> None:
+        """Record values in Loan decision trace.
+
+        :param values: Policy inputs and outputs (ex. score=700)
+        :return: None
+        """
+        self.decision_trace.update(values)
+        self.loan.decision_trace = dict(self.decision_trace)
+
+    def run_pre_screen(
+        self, policies: Iterable[LoanRefusedPolicy]
+    ) -> Optional[LoanRefusedPolicy]:
+        """Run local Policies, synchronously.
+
+        Policies not in `local_policies` are skipped.
+
+        :param policies: Policies to run, in order
+        :return: First refused policy or None
+        """
+        for policy in policies:
+            if policy not in self.local_policies:
+                logger.warning(f"Policy {policy.value} is not local. Skipping...")
+                continue
+            if not self.policy_rules[policy]():
+                return policy
+        return None
+
+    @property
+    def policy_rules(self) -> Dict[LoanRefusedPolicy, Callable[[], bool]]:
+        """Return Policy Rule method for each Policy."""
+        return {
+            LoanRefusedPolicy.AGE: self.run_age_policy,
+            LoanRefusedPolicy.SCORE: self.run_score_policy,
+            LoanRefusedPolicy.COMMITMENT: self.run_commitment_policy,
+        }
+
+    @property
+    def policy_rules_async(
+        self,
+    ) -> Dict[LoanRefusedPolicy, Callable[[], Awaitable[bool]]]:
+        """Return async Policy Rule method for each Policy."""
+        return {
+            LoanRefusedPolicy.AGE: self.run_age_policy_async,
+            LoanRefusedPolicy.SCORE: self.run_score_policy_async,
+            LoanRefusedPolicy.COMMITMENT: self.run_commitment_policy_async,
+        }
+
+    def run_analysis(self) -> Optional[LoanRefusedPolicy]:
+        """Run all Analysis Policies.
+
+        Policies run in `analysis_policies` order,
+        stopping on first refused policy.
+
+        :return: First refused policy or None if Loan was approved
+        """
+        policy_rules = self.policy_rules
+        for policy in self.analysis_policies:
+            if not policy_rules[policy]():
+                return policy
+        return None
+
+    async def run_analysis_async(self) -> Optional[LoanRefusedPolicy]:
+        """Run all Analysis Policies, asynchronously.
+
+        See `run_analysis`.
+
+        :return: First refused policy or None if Loan was approved
+        """
+        policy_rules = self.policy_rules_async
+        for policy in self.analysis_policies:
+            if not await policy_rules[policy]():
+                return policy
+        return None
 
     @classmethod
     @abstractmethod
@@ -55,6 +185,24 @@ class StakeholderBasePolicy(ABC):
         """Run Commitment Policy as per Stakeholder rules."""
         pass
 
+    async def run_age_policy_async(self) -> bool:
+        """Run Age Policy as per Stakeholder rules.
+
+        Age Policy is a local computation,
+        so the async version runs the sync one.
+        """
+        return self.run_age_policy()
+
+    @abstractmethod
+    async def run_score_policy_async(self) -> bool:
+        """Run Score Policy as per Stakeholder rules, asynchronously."""
+        pass
+
+    @abstractmethod
+    async def run_commitment_policy_async(self) -> bool:
+        """Run Commitment Policy as per Stakeholder rules, asynchronously."""
+        pass
+
     @staticmethod
     def calculate_pmt(
         present_value: float, rate_interest: float, number_period: int
@@ -72,6 +220,9 @@ class StakeholderBasePolicy(ABC):
         :param number_period: Loan Instalments
         :return: float
         """
+        import numpy as np
+        import numpy_financial as npf
+
         logger.info(
             f"Calculating PMT Using: "
             f"Present Value: {present_value}, "
@@ -82,13 +233,43 @@ class StakeholderBasePolicy(ABC):
         logger.debug(f"PMT is {pmt}")
         return pmt
 
+    @staticmethod
+    def calculate_pmts(
+        present_value: float, rates_interest: Any, number_periods: Any
+    ) -> Any:
+        """Calculate PMT for several terms at once.
+
+        Vectorized version of `calculate_pmt`: all terms are
+        calculated in a single Numpy call, with the same rounding.
+
+        :param present_value: Loan Proposed Value
+        :param rates_interest: Monthly Rate Interest for each term
+        :param number_periods: Loan Instalments for each term
+        :return: numpy array
+        """
+        import numpy as np
+        import numpy_financial as npf
+
+        pmts = npf.pmt(
+            rate=np.asarray(rates_interest, dtype=float),
+            nper=np.asarray(number_periods, dtype=int),
+            pv=present_value,
+        )
+        return np.round(pmts, decimals=2) * -1
+
     @classmethod
     @abstractmethod
     def run_terms_policy(cls, value: int) -> bool:
         """Run Terms Policy as per Stakeholder rules."""
         pass
 
+    @classmethod
+    @abstractmethod
+    def analyze_batch(cls, loans: "LoanBatch") -> "LoanBatchResult":
+        """Run all Policies for a Loan Set as per Stakeholder rules."""
+        pass
+
     @abstractmethod
-    def get_available_rates(self, score: int, min_term: int) -> pandas.Series:
+    def get_available_rates(self, score: int, min_term: int) -> "AvailableRates":
         """Get Available Rates as per Stakeholder rules."""
         pass
@@ -1,21 +1,26 @@
 """Noverde Policy Class."""
+import asyncio
+import time
+from concurrent.futures import wait
 from dataclasses import dataclass, field
-from typing import Dict, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
-import arrow
-import numpy as np
-import pandas
-import requests
 from loguru import logger
 
 from noverde_challenge.models.loan import (
     LoanAnalysisResult,
     LoanAnalysisStatus,
     LoanModel,
+    LoanRefusedPolicy,
 )
 from noverde_challenge.policies.stakeholders import StakeholderBasePolicy
-from noverde_challenge.utils.rates import get_rates
-from noverde_challenge.utils.secrets import get_secret
+from noverde_challenge.utils.exceptions import PolicyTimeoutError
+from noverde_challenge.utils.executor import get_executor
+from noverde_challenge.utils.secrets import get_cached_secret
+
+if TYPE_CHECKING:  # pragma: no cover
+    from noverde_challenge.policies.batch import LoanBatch, LoanBatchResult
+    from noverde_challenge.utils.rates import AvailableRates
 
 
 @dataclass
@@ -27,13 +32,45 @@ class NoverdePolicy(StakeholderBasePolicy):
     minimum_amount = 1000.00
     maximum_amount = 4000.00
     minimum_score = 600
+    rate_model = "noverde_rate_model"
 
     loan: LoanModel
 
     request_base_url = "https://challenge.noverde.name/"
-    request_timeout: int = 5
+    request_timeout: float = 5
+    time_budget: Optional[float] = None
+    deadline: Optional[float] = None
 
     policy_results: Dict[str, bool] = field(default_factory=dict)
+    external_values: Dict[str, Union[int, float]] = field(default_factory=dict)
+    saved_requests: int = 0
+    decision_trace: Dict[str, Any] = field(default_factory=dict)
+
+    traced_external_values = ("score", "commitment")
+
+    def __post_init__(self) -> None:
+        """Load Loan decision trace and set deadline from time budget."""
+        self.load_decision_trace()
+        if self.time_budget is not None and self.deadline is None:
+            self.deadline = time.monotonic() + self.time_budget
+
+    def get_request_timeout(self) -> float:
+        """Return timeout for next external request.
+
+        The lower of request_timeout and the time left until deadline.
+
+        :return: seconds
+        :raises: PolicyTimeoutError if deadline is exceeded
+        """
+        if self.deadline is None:
+            return self.request_timeout
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise PolicyTimeoutError(
+                f"[{self.loan.loan_id}] Policy deadline exceeded "
+                f"by {-remaining:.3f} seconds."
+            )
+        return min(self.request_timeout, remaining)
 
     def request_score(self) -> int:
         """Request Score to External Service."""
@@ -41,25 +78,170 @@ class NoverdePolicy(StakeholderBasePolicy):
 
     def request_commitment(self) -> float:
         """Request Commitment to External Service."""
-        return self._request("commitment")  # type: ignore
+        return self._request("commitment")
+
+    def _fetched_values(self, response_fields: Tuple[str, ...]) -> Dict[str, Any]:
+        return {
+            response_field: getattr(self, f"request_{response_field}")()
+            for response_field in response_fields
+            if response_field in self.external_values
+        }
+
+    def _store_values(self, values: Dict[str, Union[int, float]]) -> None:
+        # Called from the requesting thread only: abandoned requests
+        # (ex. after a timeout) never change Policy or Loan state.
+        if values:
+            self.external_values.update(values)
+            self.record_values(**values)
+
+    def _store_finished(self, response_fields: List[str], requests: List[Any]) -> None:
+        self._store_values(
+            {
+                response_field: request.result()
+                for response_field, request in zip(response_fields, requests)
+                if request.done()
+                and not request.cancelled()
+                and request.exception() is None
+            }
+        )
+
+    def request_external_values(
+        self, *response_fields: str
+    ) -> Dict[str, Union[int, float]]:
+        """Request External Values concurrently.
+
+        A single pending field is requested in the current thread.
+        Several pending fields run in parallel in the process-level
+        Thread Pool, and share the same deadline (request_timeout,
+        limited by the Policy time budget).
+
+        :param response_fields: fields to request (ex. "score")
+        :return: Dict
+        :raises: PolicyTimeoutError if deadline is exceeded
+        """
+        values = self._fetched_values(response_fields)
+        pending = [
+            response_field
+            for response_field in response_fields
+            if response_field not in values
+        ]
+        if not pending:
+            return values
+        timeout = self.get_request_timeout()
+        if len(pending) == 1:
+            value = getattr(self, f"request_{pending[0]}")()
+            self._store_values({pending[0]: value})
+            values[pending[0]] = value
+        else:
+            requests = [
+                get_executor().submit(getattr(self, f"request_{response_field}"))
+                for response_field in pending
+            ]
+            _, not_done = wait(requests, timeout=timeout)
+            self._store_finished(pending, requests)
+            if not_done:
+                for request in not_done:
+                    request.cancel()
+                raise PolicyTimeoutError(
+                    f"[{self.loan.loan_id}] Requests for {pending} "
+                    f"exceeded {timeout:.3f} seconds."
+                )
+            for response_field, done in zip(pending, requests):
+                values[response_field] = done.result()
+        return values
+
+    async def request_external_values_async(
+        self, *response_fields: str
+    ) -> Dict[str, Union[int, float]]:
+        """Request External Values concurrently.
+
+        Each field is requested using his `request_<field>` method,
+        running in the process-level Thread Pool over the pooled HTTP Session.
+        Pending requests run in parallel and share the same deadline
+        (request_timeout, limited by the Policy time budget),
+        so total latency is the slower request.
+
+        Requests are blocking calls in worker threads, so concurrency
+        across all running coroutines is capped by EXECUTOR_MAX_WORKERS
+        (default: 8) and HTTP_POOL_SIZE (see `noverde_challenge.utils.executor`),
+        not by the number of coroutines.
+
+        :param response_fields: fields to request (ex. "score")
+        :return: Dict
+        :raises: PolicyTimeoutError if deadline is exceeded
+        """
+        values = self._fetched_values(response_fields)
+        pending = [
+            response_field
+            for response_field in response_fields
+            if response_field not in values
+        ]
+        if pending:
+            timeout = self.get_request_timeout()
+            loop = asyncio.get_running_loop()
+            requests = [
+                loop.run_in_executor(
+                    get_executor(), getattr(self, f"request_{response_field}")
+                )
+                for response_field in pending
+            ]
+            _, not_done = await asyncio.wait(requests, timeout=timeout)
+            self._store_finished(pending, requests)
+            if not_done:
+                for request in not_done:
+                    request.cancel()
+                raise PolicyTimeoutError(
+                    f"[{self.loan.loan_id}] Requests for {pending} "
+                    f"exceeded {timeout:.3f} seconds."
+                )
+            for response_field, done in zip(pending, requests):
+                values[response_field] = await done
+        return values
+
+    def _request(self, response_field: str) -> Union[int, float]:
+        if response_field in self.external_values:
+            self.saved_requests += 1
+            logger.debug(
+                f"[{self.loan.loan_id}] Using fetched {response_field}. "
+                f"Saved requests: {self.saved_requests}."
+            )
+            return self.external_values[response_field]
+
+        from requests.exceptions import RequestException
+
+        from noverde_challenge.utils.http import (
+            get_http_max_retries,
+            get_http_session,
+            is_timeout,
+        )
 
-    def _request(self, response_field: str) -> Union[str, int, float]:
         url = f"{self.request_base_url}{response_field}"
+        timeout = self.get_request_timeout()
+        # Only connection errors and 5xx responses are retried by the
+        # Session: each connect attempt gets an equal share of timeout,
+        # while the single read can use all of it.
+        connect_timeout = timeout / (get_http_max_retries() + 1)
         logger.debug(
             f"[{self.loan.loan_id}] Starting request for {url}. "
-            f"Timeout is {self.request_timeout}."
+            f"Timeout is {timeout:.3f} ({connect_timeout:.3f} per connect)."
         )
         data = {"cpf": self.loan.cpf}
-        headers = {
-            "Content-Type": "application/json",
-            "x-api-key": get_secret("/noverde/api/token"),
-        }
-        response = requests.post(
-            url, json=data, headers=headers, timeout=self.request_timeout
-        )
+        headers = {"x-api-key": get_cached_secret("/noverde/api/token")}
+        try:
+            response = get_http_session().post(
+                url, json=data, headers=headers, timeout=(connect_timeout, timeout)
+            )
+        except RequestException as error:
+            if not is_timeout(error):
+                raise
+            raise PolicyTimeoutError(
+                f"[{self.loan.loan_id}] Request for {url} "
+                f"exceeded {timeout:.3f} seconds."
+            ) from error
         response.raise_for_status()
         logger.debug(f"[{self.loan.loan_id}] HTTP Response is: {response.text}")
-        return response.json()[response_field]
+        value: Union[int, float] = response.json()[response_field]
+        return value
 
     @classmethod
     def run_amount_policy(cls, amount: float) -> bool:
@@ -82,6 +264,8 @@ class NoverdePolicy(StakeholderBasePolicy):
 
         :return: Boolean
         """
+        import arrow
+
         days = (arrow.utcnow() - arrow.get(self.loan.birthdate)).days
         current_age = int(days / 365)
         result = current_age >= self.minimum_age
@@ -89,6 +273,7 @@ class NoverdePolicy(StakeholderBasePolicy):
             f"[{self.loan.loan_id}] Testing Age Policy: "
             f"{current_age} >= {self.minimum_age} = {result}"
         )
+        self.record(LoanRefusedPolicy.AGE, result, age=current_age)
         return result
 
     def run_score_policy(self) -> bool:
@@ -99,12 +284,33 @@ class NoverdePolicy(StakeholderBasePolicy):
 
         :return: Boolean
         """
-        score = self.request_score()
+        external_values = self.request_external_values("score")
+        return self.test_score(external_values["score"])
+
+    async def run_score_policy_async(self) -> bool:
+        """Run Score Policy Rule, asynchronously.
+
+        See `run_score_policy`. Requests still block worker threads:
+        across all coroutines, at most EXECUTOR_MAX_WORKERS (default: 8)
+        requests run at once, see `request_external_values_async`.
+
+        :return: Boolean
+        """
+        external_values = await self.request_external_values_async("score")
+        return self.test_score(external_values["score"])
+
+    def test_score(self, score: Union[int, float]) -> bool:
+        """Test Score Policy Rule for fetched score.
+
+        :param score: Borrower score
+        :return: Boolean
+        """
         result = score >= self.minimum_score
         logger.debug(
             f"[{self.loan.loan_id}] Testing Score Policy: "
             f"{score} >= {self.minimum_score} = {result}"
         )
+        self.record(LoanRefusedPolicy.SCORE, result, score=score)
         return result
 
     def run_commitment_policy(self) -> bool:
@@ -123,12 +329,54 @@ class NoverdePolicy(StakeholderBasePolicy):
 
         :return: Boolean
         """
-        # Get Commitment
-        commitment_rate = self.request_commitment()
-        logger.debug(f"Borrower commitment rate is {commitment_rate}")
+        external_values = self.request_external_values("commitment", "score")
+        result = self.test_commitment(
+            external_values["commitment"], int(external_values["score"])
+        )
+
+        # Save Loan if approved
+        if result:
+            self.loan.save_decision()
+            logger.info(f"[{self.loan.loan_id}] is APPROVED")
 
-        # Get Score
-        borrower_score = self.request_score()
+        return result
+
+    async def run_commitment_policy_async(self) -> bool:
+        """Run Commitment Policy Rule, asynchronously.
+
+        See `run_commitment_policy`. Requests still block worker threads:
+        across all coroutines, at most EXECUTOR_MAX_WORKERS (default: 8)
+        requests run at once, see `request_external_values_async`.
+
+        :return: Boolean
+        """
+        external_values = await self.request_external_values_async(
+            "commitment", "score"
+        )
+        result = self.test_commitment(
+            external_values["commitment"], int(external_values["score"])
+        )
+
+        # Save Loan if approved
+        if result:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(get_executor(), self.loan.save_decision)
+            logger.info(f"[{self.loan.loan_id}] is APPROVED")
+
+        return result
+
+    def test_commitment(self, commitment_rate: float, borrower_score: int) -> bool:
+        """Test Commitment Policy Rule for fetched values.
+
+        If approved, update Loan with first affordable term.
+
+        :param commitment_rate: Borrower commitment rate
+        :param borrower_score: Borrower score
+        :return: Boolean
+        """
+        import numpy as np
+
+        logger.debug(f"Borrower commitment rate is {commitment_rate}")
         logger.debug(f"Borrower score is {borrower_score}")
 
         # Get CFV
@@ -144,35 +392,44 @@ class NoverdePolicy(StakeholderBasePolicy):
         # Get Available Rates
         available_rates = self.get_available_rates(borrower_score, int(self.loan.terms))
         verbose_rates = [
-            f"Term: {term}, Rate: {available_rates[term]}"
-            for term in available_rates.keys()
+            f"Term: {term}, Rate: {rate}" for term, rate in available_rates
         ]
         logger.info(f"Available rates are: {verbose_rates}")
 
-        result = False
-        for number_period in available_rates.keys():
-            # Calculate PMT
-            present_value = self.loan.amount
-            rate_interest = available_rates[number_period]
-            pmt = self.calculate_pmt(present_value, rate_interest, int(number_period))
+        # Calculate PMT for all available terms
+        number_periods = np.array([term for term, _ in available_rates], dtype=int)
+        pmts = self.calculate_pmts(
+            self.loan.amount, [rate for _, rate in available_rates], number_periods
+        )
 
-            # Test Policy
-            result = pmt <= commitment_free_value
-            logger.debug(
-                f"[{self.loan.loan_id}] Testing Commitment Policy: "
-                f"PMT {pmt} <= CFV {commitment_free_value} = {result}"
-            )
+        # Test Policy
+        affordable = pmts <= commitment_free_value
+        logger.debug(
+            f"[{self.loan.loan_id}] Testing Commitment Policy: "
+            f"PMTs {pmts.tolist()} <= CFV {commitment_free_value} "
+            f"= {affordable.tolist()}"
+        )
+        result = bool(affordable.any())
+        values: Dict[str, Any] = {
+            "score": borrower_score,
+            "commitment": commitment_rate,
+            "cfv": float(commitment_free_value),
+        }
 
-            # Update Loan if approved
-            if result:
-                self.loan.allowed_amount = pmt
-                self.loan.allowed_terms = int(number_period)
-                self.loan.status = LoanAnalysisStatus.COMPLETED.value
-                self.loan.result = LoanAnalysisResult.APPROVED.value
-                self.loan.save()
-                logger.info(f"[{self.loan.loan_id}] is APPROVED")
-                break
+        # Update Loan with first affordable term if approved
+        if result:
+            choice = int(np.argmax(affordable))
+            self.loan.allowed_amount = float(pmts[choice])
+            self.loan.allowed_terms = int(number_periods[choice])
+            self.loan.status = LoanAnalysisStatus.COMPLETED.value
+            self.loan.result = LoanAnalysisResult.APPROVED.value
+            values.update(
+                rate=available_rates[choice][1],
+                pmt=self.loan.allowed_amount,
+                term=self.loan.allowed_terms,
+            )
 
+        self.record(LoanRefusedPolicy.COMMITMENT, result, **values)
         return result
 
     @classmethod
@@ -187,7 +444,7 @@ class NoverdePolicy(StakeholderBasePolicy):
         """
         return value in cls.valid_terms
 
-    def get_available_rates(self, score: int, min_term: int) -> pandas.Series:
+    def get_available_rates(self, score: int, min_term: int) -> "AvailableRates":
         """Get Current Available Rates.
 
         Current Rate Model can retrieved from
@@ -198,11 +455,89 @@ class NoverdePolicy(StakeholderBasePolicy):
 
         :param score: Borrower score
         :param min_term: Borrower selected term
-        :return: Series
+        :return: tuple of (term, rate)
         """
+        from noverde_challenge.utils.rates import get_rates
+
         return get_rates(
             score=score,
             min_term=min_term,
             valid_terms=self.valid_terms,
-            csv="noverde_rate_model",
+            csv=self.rate_model,
+        )
+
+    @classmethod
+    def analyze_batch(cls, loans: "LoanBatch") -> "LoanBatchResult":
+        """Run Age, Score and Commitment Policies for a Loan Set.
+
+        Apply the same rules of per-loan policies as array operations.
+        Score and commitment rates must be informed in Loan Set.
+        Refused policy is the first policy refused,
+        in Age -> Score -> Commitment order.
+
+        :param loans: LoanBatch instance
+        :return: LoanBatchResult
+        """
+        import arrow
+        import numpy as np
+
+        from noverde_challenge.policies.batch import LoanBatchResult
+        from noverde_challenge.utils.rates import get_rate_model
+
+        size = len(loans)
+        logger.info(f"Running Batch Analysis for {size} loans")
+
+        # Age Policy
+        today = np.datetime64(arrow.utcnow().date(), "D")
+        days = (today - loans.birthdate).astype(int)
+        age_result = (days / 365).astype(int) >= cls.minimum_age
+
+        # Score Policy
+        score = np.nan_to_num(loans.score, nan=0.0)
+        score_result = score >= cls.minimum_score
+
+        # Commitment Policy: get CFV
+        commitment_free_value = np.round(
+            loans.income * (1 - loans.commitment), decimals=2
+        )
+
+        # Commitment Policy: get available rates
+        rate_model = get_rate_model(cls.rate_model)
+        scores = np.array(rate_model.scores)
+        terms = np.array(
+            [term for term in cls.valid_terms if term in rate_model.term_columns]
+        )
+        columns = [rate_model.term_columns[term] for term in terms]
+        buckets = np.minimum((score / 100).astype(int) * 100, scores[-1])
+        rows = np.minimum(np.searchsorted(scores, buckets), len(scores) - 1)
+        has_rates = scores[rows] == buckets
+        available = (terms[None, :] >= loans.terms[:, None]) & has_rates[:, None]
+
+        # Commitment Policy: calculate PMT for all loans and terms
+        pmts = cls.calculate_pmts(
+            loans.amount[:, None], rate_model.rates[rows][:, columns], terms[None, :]
+        )
+        affordable = available & (pmts <= commitment_free_value[:, None])
+        commitment_result = affordable.any(axis=1)
+        choice = affordable.argmax(axis=1)
+
+        # Consolidate results
+        approved = age_result & score_result & commitment_result
+        refused_policy = np.full(size, None, dtype=object)
+        refused_policy[~commitment_result] = LoanRefusedPolicy.COMMITMENT.value
+        refused_policy[~score_result] = LoanRefusedPolicy.SCORE.value
+        refused_policy[~age_result] = LoanRefusedPolicy.AGE.value
+        logger.info(f"Batch Analysis approved {approved.sum()} of {size} loans")
+
+        return LoanBatchResult(
+            loan_id=loans.loan_id,
+            status=np.full(size, LoanAnalysisStatus.COMPLETED.value),
+            result=np.where(
+                approved,
+                LoanAnalysisResult.APPROVED.value,
+                LoanAnalysisResult.REFUSED.value,
+            ),
+            refused_policy=refused_policy,
+            allowed_amount=np.where(approved, pmts[np.arange(size), choice], np.nan),
+            allowed_terms=np.where(approved, terms[choice], 0),
         )
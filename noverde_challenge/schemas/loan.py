@@ -1,18 +1,22 @@
 """LoanModel Request Schemas."""
-import os
+import math
 import uuid
+from functools import lru_cache
 from parser import ParserError
-from typing import Type
+from typing import Any, Dict, List, Optional, Type, TypeVar, cast
 
-import arrow
-from loguru import logger
 from marshmallow import Schema, ValidationError, fields, post_load, validates
-from validate_docbr import CPF
 
 from noverde_challenge.models.loan import LoanModel
 from noverde_challenge.policies.stakeholders import StakeholderBasePolicy
 from noverde_challenge.policies.stakeholders.noverde import NoverdePolicy
-from noverde_challenge.utils.helpers import only_numbers
+from noverde_challenge.utils.helpers import (
+    is_past_iso_date,
+    is_valid_cpf,
+    only_numbers,
+)
+
+SchemaType = TypeVar("SchemaType", bound=Schema)
 
 
 class LoanModelSchema(Schema):
@@ -47,6 +51,67 @@ class LoanModelSchema(Schema):
     terms = fields.Integer(required=True, load_only=True)
     income = fields.Float(required=True, load_only=True)
 
+    fast_load_fields = frozenset(
+        ("id", "name", "cpf", "birthdate", "amount", "terms", "income")
+    )
+
+    def fast_validate(self, data: Any) -> Optional[Dict[str, Any]]:
+        """Validate a well-formed request without Marshmallow.
+
+        Accept only payloads that Marshmallow would also accept,
+        with the same deserialized values. Return None for anything
+        else, so the caller can fall back to the Marshmallow load
+        and get his exact error messages.
+
+        :param data: request data
+        :return: deserialized data or None
+        """
+        if type(data) is not dict or not data.keys() <= self.fast_load_fields:
+            return None
+        try:
+            name, cpf, birthdate = data["name"], data["cpf"], data["birthdate"]
+            terms = data["terms"]
+            amount, income = float(data["amount"]), float(data["income"])
+        except (KeyError, TypeError, ValueError, OverflowError):
+            return None
+        if (
+            type(name) is not str
+            or type(cpf) is not str
+            or type(birthdate) is not str
+            or type(terms) is not int
+            or type(data["amount"]) not in (int, float)
+            or type(data["income"]) not in (int, float)
+            or not math.isfinite(amount)
+            or not math.isfinite(income)
+        ):
+            return None
+        if not (
+            self.policy_class.run_amount_policy(amount)
+            and self.policy_class.run_terms_policy(terms)
+            and is_valid_cpf(cpf)
+            and is_past_iso_date(birthdate)
+        ):
+            return None
+        loan_id = data.get("id")
+        if loan_id is None:
+            if "id" in data:
+                return None
+            loan_id = uuid.uuid4()
+        else:
+            try:
+                loan_id = uuid.UUID(loan_id)
+            except (AttributeError, TypeError, ValueError):
+                return None
+        return {
+            "loan_id": loan_id,
+            "name": name,
+            "cpf": cpf,
+            "birthdate": birthdate,
+            "amount": amount,
+            "terms": terms,
+            "income": income,
+        }
+
     @validates("cpf")
     def validate_cpf(self, value: str) -> None:
         """Validate CPF number.
@@ -54,6 +119,8 @@ class LoanModelSchema(Schema):
         :param value: cpf value from request.
         :return: None
         """
+        from validate_docbr import CPF
+
         cpf = CPF()
         if not cpf.validate(value):
             raise ValidationError("Invalid CPF number.")
@@ -94,6 +161,8 @@ class LoanModelSchema(Schema):
         :return: None
         :raises: Marshmallow ValidationError
         """
+        import arrow
+
         try:
             date = arrow.get(value, "YYYY-MM-DD")
             if date >= arrow.utcnow():
@@ -102,22 +171,58 @@ class LoanModelSchema(Schema):
             raise ValidationError("Date must be in format YYYY-MM-DD")
 
 
-class CreateLoanModelSchema(LoanModelSchema):
-    """Create Loan Model Schema."""
+class BuildLoanModelSchema(LoanModelSchema):
+    """Build Loan Model Schema.
+
+    Deserialize request data to a new Loan Model, without saving it.
+    """
+
+    def load(
+        self,
+        data: Any,
+        *,
+        many: Optional[bool] = None,
+        partial: Any = None,
+        unknown: Optional[str] = None,
+    ) -> Any:
+        """Deserialize request data to a Loan Model.
+
+        Well-formed requests use `fast_validate`. Everything else
+        is loaded by Marshmallow, which raises the usual ValidationError.
+
+        :param data: request data
+        :param many: Marshmallow many option
+        :param partial: Marshmallow partial option
+        :param unknown: Marshmallow unknown option
+        :return: LoanModel
+        """
+        if many is None and partial is None and unknown is None and not self.many:
+            loaded = self.fast_validate(data)
+            if loaded is not None:
+                return self.make_loan(loaded)
+        return super().load(
+            data, many=many, partial=partial, unknown=unknown  # type: ignore
+        )
 
     @post_load
-    def create_loan(self, data: dict, *args, **kwargs) -> LoanModel:  # type: ignore
+    def make_loan(self, data: dict, *args, **kwargs) -> LoanModel:  # type: ignore
         """Create Loan Model from deserialized data."""
-        table_name = os.getenv("DYNAMODB_TABLE")
-        logger.debug(f"Using table {table_name}")
-        if not LoanModel.exists():
-            LoanModel.create_table(
-                read_capacity_units=1, write_capacity_units=1, wait=True
-            )
         data["loan_id"] = data["loan_id"].hex
         data["cpf"] = only_numbers(data["cpf"])
-        loan = LoanModel(**data)
-        loan.save()
+        return LoanModel(**data)
+
+
+class CreateLoanModelSchema(BuildLoanModelSchema):
+    """Create Loan Model Schema.
+
+    Deserialize request data and save the new Loan.
+    """
+
+    @post_load
+    def make_loan(self, data: dict, *args, **kwargs) -> LoanModel:  # type: ignore
+        """Create and save Loan Model from deserialized data."""
+        loan = super().make_loan(data)
+        loan.save_new()
         return loan
 
 
@@ -129,3 +234,34 @@ class RetrieveLoanModelSchema(LoanModelSchema):
     refused_policy = fields.String()
     allowed_amount = fields.Float(data_key="amount")
     allowed_terms = fields.Integer(data_key="terms")
+
+    @property
+    def projection(self) -> List[str]:
+        """Return Loan Model attributes exposed by this Schema.
+
+        :return: List
+        """
+        return [field.attribute or name for name, field in self.dump_fields.items()]
+
+
+class TraceLoanModelSchema(RetrieveLoanModelSchema):
+    """Retrieve Loan Model Schema, with Analysis decision trace."""
+
+    decision_trace = fields.Dict()
+
+
+@lru_cache(maxsize=None)
+def _schema_instance(schema_class: Type[Schema]) -> Schema:
+    return schema_class()
+
+
+def get_schema(schema_class: Type[SchemaType]) -> SchemaType:
+    """Return a shared Schema instance.
+
+    Schemas keep no request state, so one instance
+    per container can be reused by all requests.
+
+    :param schema_class: Marshmallow Schema class
+    :return: Schema instance
+    """
+    return cast(SchemaType, _schema_instance(schema_class))
@@ -0,0 +1,35 @@
+"""Asyncio Helpers Module."""
+import asyncio
+from typing import Awaitable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+
+async def gather_bounded(coroutines: Iterable[Awaitable[T]], limit: int) -> List[T]:
+    """Run coroutines concurrently, with at most `limit` running at once.
+
+    Results are returned in the same order as coroutines.
+
+    Example:
+        >>> policies = [NoverdePolicy(loan=loan) for loan in loans]
+        >>> results = asyncio.run(
+        >>>     gather_bounded(
+        >>>         (policy.run_score_policy_async() for policy in policies),
+        >>>         limit=8
+        >>>     )
+        >>> )
+
+    External requests still run in the process-level Thread Pool,
+    so a limit above EXECUTOR_MAX_WORKERS only queues more requests.
+
+    :param coroutines: Coroutines to run
+    :param limit: Max concurrent coroutines
+    :return: List
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine: Awaitable[T]) -> T:
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
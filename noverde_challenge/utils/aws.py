@@ -0,0 +1,58 @@
+"""AWS Clients Registry Module."""
+import os
+from functools import lru_cache
+from typing import Any, Iterable, Type
+
+from botocore.config import Config
+from loguru import logger
+from pynamodb.models import Model
+
+
+@lru_cache(maxsize=None)
+def get_client(service_name: str) -> Any:
+    """Get process-level boto3 client.
+
+    Clients can be configured using env:
+
+        * AWS_MAX_POOL_CONNECTIONS: Max connections kept alive (default: 10)
+        * AWS_MAX_ATTEMPTS: Max attempts, including retries (default: 3)
+
+    :param service_name: AWS service name (ex. "stepfunctions")
+    :return: boto3 client
+    """
+    import boto3
+
+    config = Config(
+        max_pool_connections=int(os.getenv("AWS_MAX_POOL_CONNECTIONS", 10)),
+        retries={"max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", 3))},
+    )
+    return boto3.client(service_name, config=config)
+
+
+def warm_up(clients: Iterable[str] = (), models: Iterable[Type[Model]] = ()) -> bool:
+    """Pre-initialize AWS clients and PynamoDB connections.
+
+    Call this function on container initialization (ex. handler decorators),
+    so the first invocation does not pay for clients creation.
+
+    This function will run only inside Lambda containers
+    (env AWS_LAMBDA_FUNCTION_NAME).
+
+    :param clients: AWS service names
+    :param models: PynamoDB models
+    :return: Boolean
+    """
+    if not os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+        return False
+
+    # noinspection PyBroadException
+    try:
+        for service_name in clients:
+            get_client(service_name)
+        for model in models:
+            model._get_connection().connection.client
+        logger.info(f"AWS clients ready.")
+        return True
+    except Exception as error:
+        logger.warning(f"AWS clients warm up failed: {error}")
+        return False
@@ -0,0 +1,76 @@
+"""In-process Cache Module.
+
+Each Lambda container has his own cache.
+
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Generic, Hashable, Optional, Tuple, TypeVar
+
+CacheValue = TypeVar("CacheValue")
+
+
+class TTLCache(Generic[CacheValue]):
+    """Least Recently Used Cache with Time To Live.
+
+    Attributes
+        * maxsize (int): Maximum number of entries
+        * ttl (float): Seconds before an entry expires
+
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        """Initialize Class.
+
+        :param maxsize: Maximum number of entries
+        :param ttl: Seconds before an entry expires
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, CacheValue]]" = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Return entries count, including expired ones."""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CacheValue]:
+        """Get value from cache.
+
+        :param key: entry key
+        :return: cached value or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: CacheValue) -> None:
+        """Add value to cache, removing the least recently used entries.
+
+        :param key: entry key
+        :param value: value to cache
+        :return: None
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries.
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
@@ -5,10 +5,10 @@ we need to manually set some
 functionalities like debugging.
 
 """
-import os
-
 from loguru import logger
 
+from noverde_challenge.utils.helpers import env_flag
+
 
 def set_remote_debug() -> bool:
     """Set Python Remote Debug for Pycharm.
@@ -32,11 +32,12 @@ def set_remote_debug() -> bool:
     >>> except Exception as e:
     >>>     logger.warning(f"VSCode Python Debug not available.")
 
-    This function will run only when serverless offline are invoked.
+    This function is opt-in: it will run only when
+    env PYCHARM_REMOTE_DEBUG is enabled (ex. "true").
 
     :return: Boolean
     """
-    if os.getenv("IS_LOCAL", False):
+    if not env_flag("PYCHARM_REMOTE_DEBUG"):
         return False
 
     # noinspection PyBroadException
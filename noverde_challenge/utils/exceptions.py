@@ -0,0 +1,23 @@
+"""Application Exceptions."""
+from concurrent.futures import TimeoutError
+
+
+class TableNotFoundError(Exception):
+    """DynamoDB table does not exist.
+
+    Tables are created by Serverless resources
+    or by the migration command (`make migrate`),
+    never during requests.
+    """
+
+
+class ConfigurationError(Exception):
+    """Invalid application configuration (ex. env values)."""
+
+
+class PolicyTimeoutError(TimeoutError):
+    """Policy time budget exceeded.
+
+    Raised before the Lambda timeout, so State Machine
+    can catch and retry the step (see `Retry` in serverless.yml).
+    """
@@ -0,0 +1,25 @@
+"""Shared Thread Pool Module.
+
+External requests are blocking calls running in this pool, so
+concurrent requests per container are capped by EXECUTOR_MAX_WORKERS
+(default: 8) and by HTTP_POOL_SIZE (default: 10, connections kept
+alive per host). Raise both together to run more requests at once.
+
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def get_executor() -> ThreadPoolExecutor:
+    """Get process-level Thread Pool.
+
+    Max workers can be configured using env EXECUTOR_MAX_WORKERS.
+
+    :return: ThreadPoolExecutor
+    """
+    max_workers = int(os.getenv("EXECUTOR_MAX_WORKERS", 8))
+    return ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="noverde_challenge"
+    )
@@ -1,8 +1,11 @@
 """Handler Task Config Decorator."""
+import os
+import time
 from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 
 from loguru import logger
-from sentry_sdk import capture_exception  # type: ignore
+from pynamodb.exceptions import UpdateError
 
 from noverde_challenge.models.loan import (
     LoanAnalysisResult,
@@ -11,29 +14,144 @@ from noverde_challenge.models.loan import (
     LoanRefusedPolicy,
 )
 from noverde_challenge.policies.stakeholders.noverde import NoverdePolicy
+from noverde_challenge.utils.aws import warm_up
+from noverde_challenge.utils.helpers import env_flag
+from noverde_challenge.utils.runtime import initialize
 
 
-def handler_task(refused_policy: LoanRefusedPolicy):
+def get_time_budget(context: object) -> Optional[float]:
+    """Get Policy time budget from Lambda remaining time.
+
+    Remaining time minus a safety margin (env POLICY_TIMEOUT_MARGIN,
+    default 1 second), left to save the decision and return.
+
+    :param context: Serverless context instance
+    :return: seconds or None if context has no remaining time
+    """
+    get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+    if not get_remaining_time:
+        return None
+    margin = float(os.getenv("POLICY_TIMEOUT_MARGIN", 1))
+    return max(get_remaining_time() / 1000 - margin, 0.0)
+
+
+def save_trace(loan: LoanModel) -> None:
+    """Save Loan decision trace after a failed step, if any.
+
+    Errors are only logged: the original error must be raised.
+
+    :param loan: Loan Model instance
+    :return: None
+    """
+    if not loan.decision_trace:
+        return
+    try:
+        loan.save_trace()
+    except Exception as error:
+        logger.warning(f"[{loan.loan_id}] Could not save decision trace: {error}")
+
+
+def handler_task(refused_policy: Optional[LoanRefusedPolicy] = None):
     """Configure Handler Task Decorator.
 
     This decorator will config the handler for the following options:
 
         * refused_policy: The Policy which will be used on refused analysis
 
+    Handlers return a boolean (Loan passed the policy) or, if
+    refused_policy is not informed, the refused policy (None if passed).
+
 
     Workflow:
 
         1. Get Input data
-        2. Find Loan and Policy Class
-        3. Invoke the Handler function
+        2. Find Loan and create Stakeholder Policy
+        3. Invoke the Handler function, if Loan analysis is not completed
         5. Save refused policy in database, if any.
-        6. Handle Errors
+        6. Return Loan status and fetched external values
+        7. Handle Errors
+
+    Policies inputs and outputs (ex. score, CFV, chosen rate and PMT)
+    are recorded in Loan decision trace and saved with the decision.
+    The trace has credit data, so it is not returned: use the Loan trace
+    endpoint instead. If the Handler fails, the trace is saved before
+    raising the error, so retried steps reuse recorded values.
+
+    External values (ex. score, commitment) fetched by Policy are returned
+    in "external_values" key. State Machine uses this output
+    as next step input, so each value is fetched once per analysis.
+
+    If env LOAN_STATE_IN_PAYLOAD is enabled, Loan attributes are also
+    returned in "loan" key, and next step rebuilds the Loan from it instead
+    of reading DynamoDB. These attributes have personal data (ex. CPF, name,
+    birthdate and income): keep State Machine includeExecutionData disabled
+    when using this option.
+
+    External requests use the Lambda remaining time (minus a safety margin)
+    as time budget, and raise PolicyTimeoutError before the Lambda timeout,
+    so State Machine can retry the step.
+
+    Decisions are saved only if Loan is still processing and his version
+    did not change (ex. stale payload, duplicated execution). Otherwise,
+    Loan is read again and handler runs once more.
 
     :param refused_policy: LoanRefusedPolicy enum
     :return: Dict
     """
 
+    def run(
+        f: Callable[..., Any],
+        loan: LoanModel,
+        deadline: Optional[float],
+        event: Dict[str, Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> Tuple[LoanModel, Dict[str, Union[int, float]]]:
+        # Analysis already completed (ex. retried steps)
+        if loan.status != LoanAnalysisStatus.PROCESSING.value:
+            logger.info(f"[{loan.loan_id}] Loan analysis is already completed")
+            return loan, {}
+
+        # Get Stakeholder Policy
+        # For this challenge, it will be fixed
+        policy_class = NoverdePolicy
+        policy = policy_class(
+            loan=loan,
+            external_values=dict(event.get("external_values", {})),
+            deadline=deadline,
+        )
+        kwargs["loan"] = loan
+        kwargs["policy"] = policy
+
+        # Call Handler
+        try:
+            result = f(event, *args, **kwargs)
+        except Exception:
+            save_trace(loan)
+            raise
+        if isinstance(result, bool):
+            refused = None if result else refused_policy
+        else:
+            refused = result
+
+        # Mark loan refused
+        if refused:
+            loan.status = LoanAnalysisStatus.COMPLETED.value
+            loan.refused_policy = refused.value
+            loan.result = LoanAnalysisResult.REFUSED.value
+            loan.save_decision()
+            logger.info(f"[{loan.loan_id}] Loan is DENIED")
+
+        if policy.saved_requests:
+            logger.info(
+                f"[{loan.loan_id}] External requests saved: " f"{policy.saved_requests}"
+            )
+        return loan, policy.external_values
+
     def config(f):
+        initialize()
+        warm_up(models=[LoanModel])
+
         @wraps(f)
         def wrapper(*args, **kwargs):
             try:
@@ -43,38 +161,45 @@ def handler_task(refused_policy: LoanRefusedPolicy):
                 # Get input data
                 event = args[0]
                 loan_id = event.get("loan_id")
+                time_budget = get_time_budget(args[1] if len(args) > 1 else None)
+                deadline = (
+                    None if time_budget is None else time.monotonic() + time_budget
+                )
 
                 # Get Loan object
-                loan = LoanModel.get(hash_key=loan_id)
-                kwargs["loan"] = loan
-
-                # Get Stakeholder Policy
-                # For this challenge, it will be fixed
-                policy_class = NoverdePolicy
-                kwargs["policy_class"] = policy_class
-
-                # Call Handler
-                result: bool = f(*args, **kwargs)
-
-                # Mark loan refused
-                if not result:
-                    loan.status = LoanAnalysisStatus.COMPLETED.value
-                    loan.refused_policy = refused_policy.value
-                    loan.result = LoanAnalysisResult.REFUSED.value
-                    loan.save()
-                    logger.info(f"[{loan.loan_id}] Loan is DENIED")
+                payload_loan = LoanModel.from_payload(loan_id, event.get("loan"))
+                from_payload = payload_loan is not None
+                loan = payload_loan or LoanModel.get(hash_key=loan_id)
+
+                try:
+                    loan, external_values = run(f, loan, deadline, *args, **kwargs)
+                except UpdateError as error:
+                    if error.cause_response_code != "ConditionalCheckFailedException":
+                        raise
+                    logger.warning(
+                        f"[{loan_id}] Loan was changed during analysis. "
+                        f"Loan from payload: {from_payload}"
+                    )
+                    loan = LoanModel.get(hash_key=loan_id, consistent_read=True)
+                    loan, external_values = run(f, loan, deadline, *args, **kwargs)
 
                 # Return data
-                return {
+                data = {
                     "loan_id": loan.loan_id,
                     "status": loan.status,
                     "result": loan.result,
+                    "external_values": external_values,
                 }
+                if env_flag("LOAN_STATE_IN_PAYLOAD"):
+                    data["loan"] = loan.to_payload()
+                return data
             except Exception as error:
                 # For this challenge, error handling will be very simple.
                 # In production settings, some errors are handled here
                 # and others are handled in State Machine,
                 # to allow Catch, Retry, etc.. (ex. Timeouts)
+                from sentry_sdk import capture_exception  # type: ignore
+
                 capture_exception(error)
                 logger.error(f"Internal Error during request: {error}")
                 raise
@@ -7,39 +7,117 @@ In production settings, its easier to develop when:
 * Running API lambdas in ES6 or Typescript
 * Running Step Functions in Python
 """
+import hashlib
 import json
 from functools import wraps
-from typing import Optional, Type
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
 
 from loguru import logger
 from marshmallow import Schema, ValidationError
-from sentry_sdk import capture_exception  # type: ignore
 
+from noverde_challenge.models.loan import LoanModel
+from noverde_challenge.schemas.loan import get_schema
+from noverde_challenge.utils.aws import warm_up
+from noverde_challenge.utils.runtime import initialize
 from noverde_challenge.utils.status_code import StatusCode
 
 
-def handler_view(model_schema: Optional[Type[Schema]] = None):
+def validation_errors(messages: Union[Dict[str, Any], List[Any]]) -> List[str]:
+    """Format Marshmallow error messages as API errors.
+
+    :param messages: ValidationError messages
+    :return: List
+    """
+    if isinstance(messages, list):
+        return [str(message) for message in messages]
+    return [
+        f"{field_key}: {description}"
+        for field_key in messages
+        for description in messages[field_key]
+    ]
+
+
+def request_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    """Get request header, ignoring name case.
+
+    :param event: Serverless Event instance
+    :param name: header name
+    :return: header value or None
+    """
+    headers = event.get("headers") or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return str(value)
+    return None
+
+
+def make_etag(body: str) -> str:
+    """Return strong ETag for response body.
+
+    :param body: encoded response body
+    :return: quoted ETag
+    """
+    return f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Check If-None-Match request header against ETag.
+
+    Uses weak comparison, as per RFC 7232.
+
+    :param etag: response ETag
+    :param if_none_match: If-None-Match header value
+    :return: Boolean
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+
+def handler_view(
+    model_schema: Optional[Type[Schema]] = None,
+    clients: Tuple[str, ...] = (),
+    pass_body: bool = False,
+    etag: bool = False,
+):
     """Configure Handler View Decorator.
 
     This decorator will config the handler for the following options:
 
         * model_schema: The Marshmallow schema to be used in POST requests
+        * clients: AWS clients used by handler, created on container init
+        * pass_body: Pass decoded request body to handler as `data`
+        * etag: Add ETag to 200 responses and
+          return 304 Not Modified when If-None-Match matches
 
 
     Think this decorator a very simple middleware for handlers. Current workflow is:
 
         1. Get json data from event["body"]
         2. Deserialize data using Marshmallow
-        3. Save data on DynamoDB
+        3. Save data on DynamoDB, if Schema does it (ex. CreateLoanModelSchema)
         4. Invoke the Handler function
-        5. Return Handler data, in a compatible API Gateway response
+        5. Return Handler data, in a compatible API Gateway response.
+           Bodies already encoded by the handler (str) are returned as is.
         6. Handle Errors
 
+    Handlers can return a "headers" dict, added to the response.
+
     :param model_schema: Marshmallow Schema
+    :param clients: AWS service names
+    :param pass_body: Pass decoded body to handler
+    :param etag: Use ETag and If-None-Match
     :return: Dict
     """
 
     def config(f):
+        initialize()
+        warm_up(clients=clients, models=[LoanModel])
+
         @wraps(f)
         def wrapper(*args, **kwargs):
             try:
@@ -51,31 +129,45 @@ def handler_view(model_schema: Optional[Type[Schema]] = None):
                 # Create Loan object
                 if raw_data and model_schema:
                     logger.debug("Start creating loan...")
-                    loan = model_schema().load(raw_data)
+                    loan = get_schema(model_schema).load(raw_data)
                     kwargs["loan"] = loan
+                if pass_body:
+                    kwargs["data"] = raw_data
 
                 # Call Handler
                 ret = f(*args, **kwargs)
 
                 # Return API Gateway compatible data
-                return {
-                    "statusCode": ret["statusCode"].value,
-                    "body": json.dumps(ret["body"]),
-                }
+                response_body = ret["body"]
+                if not isinstance(response_body, str):
+                    response_body = json.dumps(response_body)
+                status_code = ret["statusCode"]
+                headers = dict(ret.get("headers", {}))
+                if etag and status_code == StatusCode.OK:
+                    headers["ETag"] = make_etag(response_body)
+                    if etag_matches(
+                        headers["ETag"], request_header(event, "If-None-Match")
+                    ):
+                        return {
+                            "statusCode": StatusCode.NOT_MODIFIED.value,
+                            "headers": headers,
+                            "body": "",
+                        }
+                response = {"statusCode": status_code.value, "body": response_body}
+                if headers:
+                    response["headers"] = headers
+                return response
             except ValidationError as error:
                 # Handle Bad Request Errors
                 logger.error(f"Validation Error during request: {error.messages}")
-                error_list = [
-                    f"{field_key}: {description}"
-                    for field_key in error.messages
-                    for description in error.messages[field_key]
-                ]
                 return {
                     "statusCode": StatusCode.BAD_REQUEST.value,
-                    "body": json.dumps({"errors": error_list}),
+                    "body": json.dumps({"errors": validation_errors(error.messages)}),
                 }
             except Exception as error:
                 # Handle Internal Server Errors
+                from sentry_sdk import capture_exception  # type: ignore
+
                 capture_exception(error)
                 logger.error(f"Internal Error during request: {error}")
                 return {
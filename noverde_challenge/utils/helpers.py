@@ -1,4 +1,34 @@
 """Application Helpers."""
+import os
+import re
+from datetime import datetime, timezone
+
+ISO_DATE_REGEX = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})")
+
+
+TRUE_VALUES = frozenset(["1", "true", "yes", "on"])
+FALSE_VALUES = frozenset(["", "0", "false", "no", "off"])
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Read boolean flag from env.
+
+    Accept 1/true/yes/on and 0/false/no/off (case insensitive).
+
+    :param name: env name
+    :param default: value when env is not set
+    :return: Boolean
+    :raises: ValueError if env has another value
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    normalized = value.strip().lower()
+    if normalized in TRUE_VALUES:
+        return True
+    if normalized in FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid boolean value for env {name}: {value!r}")
 
 
 def only_numbers(value: str) -> str:
@@ -8,3 +38,44 @@ def only_numbers(value: str) -> str:
     :return: string
     """
     return "".join([character for character in value if character.isdigit()])
+
+
+def is_valid_cpf(value: str) -> bool:
+    """Validate CPF check digits.
+
+    Same rules from `validate_docbr.CPF`, without
+    creating a validator instance per call:
+    11 ASCII digits, not all repeated, and both check digits.
+
+    :param value: CPF number, with or without mask
+    :return: Boolean
+    """
+    digits = only_numbers(value)
+    if len(digits) != 11 or not digits.isascii() or len(set(digits)) == 1:
+        return False
+    numbers = [int(digit) for digit in digits]
+    for position in (9, 10):
+        total = sum(
+            number * weight
+            for number, weight in zip(numbers[:position], range(position + 1, 1, -1))
+        )
+        if total * 10 % 11 % 10 != numbers[position]:
+            return False
+    return True
+
+
+def is_past_iso_date(value: str) -> bool:
+    """Check if value is a YYYY-MM-DD date before now (UTC).
+
+    :param value: date string
+    :return: Boolean
+    """
+    match = ISO_DATE_REGEX.fullmatch(value)
+    if not match:
+        return False
+    year, month, day = (int(group) for group in match.groups())
+    try:
+        date = datetime(year, month, day, tzinfo=timezone.utc)
+    except ValueError:
+        return False
+    return date < datetime.now(timezone.utc)
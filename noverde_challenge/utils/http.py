@@ -0,0 +1,87 @@
+"""HTTP Session Module."""
+import os
+from functools import lru_cache
+from typing import Dict, FrozenSet
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+
+def get_http_max_retries() -> int:
+    """Get max retries for HTTP Session (env HTTP_MAX_RETRIES).
+
+    :return: int
+    """
+    return int(os.getenv("HTTP_MAX_RETRIES", 2))
+
+
+def get_retry_methods() -> Dict[str, FrozenSet[str]]:
+    """Get Retry keyword for retried HTTP methods.
+
+    urllib3 1.26 renamed `method_whitelist` to `allowed_methods`,
+    and urllib3 2.0 removed the old name.
+
+    :return: Dict
+    """
+    methods = frozenset(["GET", "POST"])
+    if hasattr(Retry, "DEFAULT_ALLOWED_METHODS"):
+        return {"allowed_methods": methods}
+    return {"method_whitelist": methods}
+
+
+@lru_cache(maxsize=None)
+def get_http_session() -> requests.Session:
+    """Get process-level HTTP Session.
+
+    Session can be configured using env:
+
+        * HTTP_POOL_SIZE: Max connections kept alive per host (default: 10)
+        * HTTP_MAX_RETRIES: Max retries on connection errors
+            and 502, 503 and 504 responses (default: 2)
+
+    Read errors (ex. read timeouts) are never retried: the request
+    may have reached the server, and POST requests are not idempotent.
+    Worst-case latency is still (HTTP_MAX_RETRIES + 1) times the
+    connect timeout, see `get_http_max_retries`.
+
+    :return: requests.Session
+    """
+    pool_size = int(os.getenv("HTTP_POOL_SIZE", 10))
+    max_retries = get_http_max_retries()
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,
+        status=max_retries,
+        backoff_factor=0.1,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+        **get_retry_methods(),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+def is_timeout(error: Exception) -> bool:
+    """Return if HTTP request error was caused by a timeout.
+
+    With retries enabled, urllib3 wraps timeouts in MaxRetryError,
+    which requests raises as ConnectionError instead of Timeout.
+
+    :param error: requests exception
+    :return: Boolean
+    """
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, (ConnectTimeoutError, ReadTimeoutError))
@@ -1,52 +1,222 @@
-"""Get Available Rates module."""
+"""Get Available Rates module.
 
-from typing import List
+The Rate Model CSV is compiled once per process
+in a dense array (one row per score bucket, one column per term)
+and kept in a module cache. Lookups do not touch the file system.
 
-import pandas
+Use `reload_rate_model` or `invalidate_rate_models` to refresh
+the cache, or set env `RATE_MODEL_CHECK_MTIME` to reload the model
+when the CSV file changes.
+
+Pandas is not required at runtime: the CSV is parsed with the
+standard library. Install the `offline` extra to use
+`RateModel.to_dataframe` in offline tooling.
+
+"""
+import csv
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from noverde_challenge.utils.helpers import env_flag
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas
+
+RATES_DATA_DIR = Path(__file__).resolve().parent.parent.joinpath("policies", "data")
+
+AvailableRates = Tuple[Tuple[int, float], ...]
+RateTable = Tuple[Tuple[int, ...], Tuple[int, ...], List[List[float]]]
+
+
+def read_rate_table(path: Path) -> RateTable:
+    """Read Rate Model CSV file.
+
+    First column is the score bucket,
+    the header of the other columns are the terms.
+
+    :param path: CSV file path
+    :return: tuple of (scores, terms, rates rows), sorted by score
+    """
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        rows = sorted(
+            (int(float(row[0])), [float(value) for value in row[1:]])
+            for row in reader
+            if row
+        )
+    scores = tuple(score for score, _ in rows)
+    terms = tuple(int(term) for term in header[1:])
+    return scores, terms, [values for _, values in rows]
+
+
+@dataclass(frozen=True)
+class RateModel:
+    """Compiled Rate Model.
+
+    Attributes
+        * path (Path): CSV file path
+        * mtime (float): CSV modification time when loaded
+        * scores (tuple): Score buckets, in ascending order
+        * terms (tuple): Available terms
+        * rates (ndarray): Rates array, shape (scores, terms)
+        * score_rows (dict): Rates row for each score bucket
+        * term_columns (dict): Rates column for each term
+
+    """
+
+    path: Path
+    mtime: float
+    scores: Tuple[int, ...]
+    terms: Tuple[int, ...]
+    rates: Any
+    score_rows: Dict[int, int]
+    term_columns: Dict[int, int]
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "RateModel":
+        """Compile Rate Model from CSV file.
+
+        :param path: CSV file path
+        :return: RateModel
+        """
+        scores, terms, rows = read_rate_table(path)
+        rates = np.array(rows, dtype=float)
+        rates.setflags(write=False)
+        return cls(
+            path=path,
+            mtime=os.stat(path).st_mtime,
+            scores=scores,
+            terms=terms,
+            rates=rates,
+            score_rows={score: row for row, score in enumerate(scores)},
+            term_columns={term: column for column, term in enumerate(terms)},
+        )
+
+    @property
+    def is_stale(self) -> bool:
+        """Return if CSV file was changed after load."""
+        return os.stat(self.path).st_mtime != self.mtime
+
+    def get_row(self, score: int) -> Optional[int]:
+        """Return Rates row for Borrower score.
+
+        Score is truncated to his hundred bucket.
+        Scores above the last bucket use the last bucket.
+
+        :param score: Borrower score
+        :return: row index or None if score is below first bucket
+        """
+        index = int(score / 100) * 100
+        if index < self.scores[0]:
+            return None
+        if index > self.scores[-1]:
+            index = self.scores[-1]
+        return self.score_rows[index]
+
+    def lookup(
+        self, score: int, min_term: int, valid_terms: List[int]
+    ) -> AvailableRates:
+        """Lookup available (term, rate) pairs for Borrower.
+
+        :param score: Borrower current score
+        :param min_term: Borrower selected term
+        :param valid_terms: Current Policy valid terms
+        :return: tuple of (term, rate)
+        """
+        row = self.get_row(score)
+        if row is None:
+            return ()
+        return tuple(
+            (term, float(self.rates[row, self.term_columns[term]]))
+            for term in valid_terms
+            if term >= min_term and term in self.term_columns
+        )
+
+    def to_dataframe(self) -> "pandas.DataFrame":
+        """Return Rate Model as a Pandas DataFrame.
+
+        For offline tooling only. Requires the `offline` extra.
+
+        :return: DataFrame indexed by score, one column per term
+        """
+        import pandas
+
+        return pandas.DataFrame(
+            self.rates,
+            index=pandas.Index(self.scores, name="score"),
+            columns=[str(term) for term in self.terms],
+        )
+
+
+_rate_models: Dict[str, RateModel] = {}
+_rate_models_lock = Lock()
+
+
+def rate_model_path(csv: str) -> Path:
+    """Return Rate Model CSV path.
+
+    :param csv: CSV filename
+    :return: Path
+    """
+    return RATES_DATA_DIR.joinpath(f"{csv}.csv")
+
+
+def reload_rate_model(csv: str) -> RateModel:
+    """Load Rate Model from disk and update cache.
+
+    :param csv: CSV filename
+    :return: RateModel
+    """
+    with _rate_models_lock:
+        rate_model = RateModel.from_csv(rate_model_path(csv))
+        _rate_models[csv] = rate_model
+    return rate_model
+
+
+def invalidate_rate_models(csv: Optional[str] = None) -> None:
+    """Remove Rate Models from cache.
+
+    :param csv: CSV filename. If None, remove all models.
+    :return: None
+    """
+    with _rate_models_lock:
+        if csv is None:
+            _rate_models.clear()
+        else:
+            _rate_models.pop(csv, None)
+
+
+def get_rate_model(csv: str, check_mtime: Optional[bool] = None) -> RateModel:
+    """Get cached Rate Model.
+
+    :param csv: CSV filename
+    :param check_mtime: Reload model if CSV file was changed.
+        Default from env RATE_MODEL_CHECK_MTIME.
+    :return: RateModel
+    """
+    if check_mtime is None:
+        check_mtime = env_flag("RATE_MODEL_CHECK_MTIME")
+    rate_model = _rate_models.get(csv)
+    if rate_model is None or (check_mtime and rate_model.is_stale):
+        rate_model = reload_rate_model(csv)
+    return rate_model
 
 
 def get_rates(
     score: int, min_term: int, valid_terms: List[int], csv: str
-) -> pandas.Series:
+) -> AvailableRates:
     """Get Available Rates for current Model and Borrower.
 
-    This method can be used in PyCharm Scientific Mode.
-    To do this, please uncomment test values inside each Cell.
-
     :param score: Borrower current score
     :param min_term: Borrower selected term
     :param valid_terms: Current Policy valid terms
     :param csv: CSV filename
-    :return: pandas.Series
+    :return: tuple of (term, rate)
     """
-    # %%
-    import os
-    from pathlib import Path
-    import pandas
-
-    # Uncomment in scientific mode for tests
-    # csv = "noverde_rate_model"
-
-    current_dir = os.getcwd()
-    data_frame_path = Path().joinpath(
-        current_dir, "noverde_challenge", "policies", "data", f"{csv}.csv",
-    )
-    df = pandas.read_csv(data_frame_path)
-    df.set_index("score", inplace=True)
-    # %%
-    # Uncomment in scientific mode for tests
-    # valid_terms = [6, 9, 12]
-    # score = 600
-    # min_term = 9
-
-    available_terms = [str(term) for term in valid_terms if term >= min_term]
-    # %%
-    index = int(score / 100) * 100
-    if index < df.index.min():
-        return pandas.Series()
-    if index > df.index.max():
-        index = df.index.max()
-    filtered_rates = df.filter(items=available_terms)
-    available_rates = filtered_rates.loc[index]
-    # %%
-    return available_rates
+    return get_rate_model(csv).lookup(score, min_term, valid_terms)
@@ -0,0 +1,21 @@
+"""Runtime Initialization Module.
+
+Sentry and remote debug setup run once per container,
+when the first handler is configured, instead of on package import.
+
+"""
+from functools import lru_cache
+
+from noverde_challenge.utils.debug import set_remote_debug
+from noverde_challenge.utils.sentry import configure_sentry
+
+
+@lru_cache(maxsize=None)
+def initialize() -> bool:
+    """Initialize runtime integrations once per process.
+
+    :return: Boolean
+    """
+    set_remote_debug()
+    configure_sentry()
+    return True
@@ -1,6 +1,6 @@
 """Get Secrets Module."""
 import os
-from typing import Optional
+from typing import Dict, Optional
 
 from loguru import logger
 
@@ -19,3 +19,32 @@ def get_secret(secret: str) -> Optional[str]:
     env_name = secret.replace("/", "_").upper()[1:]
     logger.debug(f"Looking for env {env_name}")
     return os.getenv(env_name)
+
+
+_secrets: Dict[str, str] = {}
+
+
+def get_cached_secret(secret: str) -> Optional[str]:
+    """Get Secrets once per process.
+
+    Use this function in hot paths, like external requests.
+    Missing secrets are not cached, so they are read again
+    on next call.
+
+    :param secret: AWS SM Parameter Service qualified name
+    :return: string
+    """
+    value = _secrets.get(secret)
+    if value is None:
+        value = get_secret(secret)
+        if value is not None:
+            _secrets[secret] = value
+    return value
+
+
+def clear_cached_secrets() -> None:
+    """Remove all Secrets from process cache.
+
+    :return: None
+    """
+    _secrets.clear()
@@ -1,15 +1,16 @@
 """Configure Sentry."""
 import os
 
-import sentry_sdk
 from loguru import logger
-from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
 
 
 def configure_sentry() -> bool:
     """Configure Sentry."""
     dsn = os.getenv("SENTRY_DSN")
     if dsn:
+        import sentry_sdk
+        from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
+
         env = os.getenv("SENTRY_ENV")
         sentry_sdk.init(  # type: ignore
             dsn=dsn, integrations=[AwsLambdaIntegration()], environment=env
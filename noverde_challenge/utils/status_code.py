@@ -8,6 +8,8 @@ class StatusCode(Enum):
 
     OK = 200
     CREATED = 201
+    NOT_MODIFIED = 304
     BAD_REQUEST = 400
     NOT_FOUND = 404
+    CONFLICT = 409
     INTERNAL_ERROR = 500
@@ -1,9 +1,26 @@
 """Pytest Configuration file."""
-import numpy as np
-import pandas as pd
 from pytest import fixture
 
 from noverde_challenge.models.loan import LoanModel
+from noverde_challenge.utils.rates import invalidate_rate_models
+
+
+@fixture(autouse=True)
+def clear_rate_models():
+    """Clear Rate Models cache between tests."""
+    invalidate_rate_models()
+    yield
+    invalidate_rate_models()
+
+
+@fixture(autouse=True)
+def clear_loan_cache():
+    """Clear Completed Loans cache between tests."""
+    from noverde_challenge.handlers.loan import completed_loans
+
+    completed_loans.clear()
+    yield
+    completed_loans.clear()
 
 
 @fixture
@@ -22,22 +39,25 @@ def loan_model():
         "refused_policy": None,
         "allowed_amount": None,
         "allowed_terms": None,
+        "decision_trace": None,
     }
     return LoanModel(**data)
 
 
 @fixture
-def test_rate_model():
-    """Return a Test Interest Rate Model."""
-    df = pd.DataFrame(
-        np.array(
-            (
-                [600, 0.080, 0.085, 0.090],
-                [700, 0.065, 0.070, 0.075],
-                [800, 0.050, 0.055, 0.060],
-                [900, 0.035, 0.040, 0.045],
-            )
-        ),
-        columns=["score", "6", "9", "12"],
+def test_rate_model(tmp_path, monkeypatch):
+    """Use a Test Interest Rate Model.
+
+    Write the model CSV in a temporary Rates Data dir
+    and return his path.
+    """
+    path = tmp_path.joinpath("noverde_rate_model.csv")
+    path.write_text(
+        "score,6,9,12\n"
+        "600,0.080,0.085,0.090\n"
+        "700,0.065,0.070,0.075\n"
+        "800,0.050,0.055,0.060\n"
+        "900,0.035,0.040,0.045\n"
     )
-    return df
+    monkeypatch.setattr("noverde_challenge.utils.rates.RATES_DATA_DIR", tmp_path)
+    return path
@@ -5,3 +5,140 @@ def test_model_attributes():
     attributes = ["loan_id", "name", "cpf", "birthdate", "amount", "terms", "income"]
     for attribute in attributes:
         assert attribute in dir(LoanModel)
+
+
+def test_model_from_payload(loan_model):
+    loan_model.version = 3
+    payload = loan_model.to_payload()
+    loan = LoanModel.from_payload(loan_model.loan_id, payload)
+    assert loan.attribute_values == loan_model.attribute_values
+    assert LoanModel.from_payload("another_loan", payload) is None
+    assert LoanModel.from_payload(loan_model.loan_id, None) is None
+    del payload["version"]
+    assert LoanModel.from_payload(loan_model.loan_id, payload) is None
+
+
+def test_model_save_decision(loan_model, mocker):
+    connection = mocker.patch.object(LoanModel, "_get_connection")
+    connection.return_value.update_item.return_value = {
+        "Attributes": {"version": {"N": "1"}}
+    }
+    loan_model.status = "completed"
+    loan_model.result = "refused"
+    loan_model.refused_policy = "age"
+    loan_model.save_decision()
+
+    kwargs = connection.return_value.update_item.call_args[1]
+    names = [action.values[0].path for action in kwargs["actions"]]
+    assert names == [["status"], ["result"], ["refused_policy"], ["version"]]
+    assert "status" in str(kwargs["condition"])
+
+
+def test_model_save_trace(loan_model, mocker):
+    update = mocker.patch.object(LoanModel, "update")
+    loan_model.decision_trace = {"score": 700}
+    loan_model.save_trace()
+
+    kwargs = update.call_args[1]
+    assert kwargs["actions"][0].values[0].path == ["decision_trace"]
+    assert "status" in str(kwargs["condition"])
+
+
+def test_model_save_new_batch_partial_failure(loan_model, mocker):
+    from copy import deepcopy
+
+    from pynamodb.exceptions import PutError
+
+    loans = []
+    for index in range(30):
+        loan = deepcopy(loan_model)
+        loan.loan_id = f"loan-{index}"
+        loans.append(loan)
+    connection = mocker.patch.object(LoanModel, "_get_connection")
+    connection.return_value.batch_write_item.side_effect = [PutError("Boom"), {}]
+
+    failed = LoanModel.save_new_batch(loans)
+    assert sorted(failed) == sorted(loan.loan_id for loan in loans[:25])
+    assert connection.return_value.batch_write_item.call_count == 2
+
+
+def test_model_save_new_table_not_found(loan_model, mocker):
+    import pytest
+    from botocore.exceptions import ClientError
+    from pynamodb.exceptions import PutError
+
+    from noverde_challenge.utils.exceptions import TableNotFoundError
+
+    cause = ClientError({"Error": {"Code": "ResourceNotFoundException"}}, "PutItem")
+    connection = mocker.patch.object(LoanModel, "_get_connection")
+    connection.return_value.batch_write_item.side_effect = PutError(cause=cause)
+    with pytest.raises(TableNotFoundError):
+        LoanModel.save_new_batch([loan_model])
+
+    mocker.patch.object(LoanModel, "save", side_effect=PutError(cause=cause))
+    with pytest.raises(TableNotFoundError):
+        loan_model.save_new()
+
+
+def test_model_ensure_table(mocker):
+    import pytest
+
+    from noverde_challenge.utils.exceptions import TableNotFoundError
+
+    mocker.patch.object(LoanModel, "_table_verified", False)
+    exists = mocker.patch.object(LoanModel, "exists", return_value=False)
+    create_table = mocker.patch.object(LoanModel, "create_table")
+    with pytest.raises(TableNotFoundError):
+        LoanModel.ensure_table()
+    assert not create_table.called
+
+    LoanModel.ensure_table(create=True)
+    LoanModel.ensure_table(create=True)
+    assert create_table.call_count == 1
+    assert exists.call_count == 2
+
+
+def test_model_find_by_cpf(loan_model, mocker):
+    query = mocker.patch.object(LoanModel, "query", return_value=iter([loan_model]))
+    loans = list(LoanModel.find_by_cpf("07724426067", since="2020-01-01", limit=5))
+    assert loans == [loan_model]
+    assert query.call_args[0][0] == "07724426067"
+    assert query.call_args[1]["index_name"] == "cpf-index"
+    assert query.call_args[1]["scan_index_forward"] is False
+    assert query.call_args[1]["limit"] == 5
+    assert query.call_args[1]["range_key_condition"] is not None
+
+
+def test_model_created_at_is_sortable(loan_model):
+    from noverde_challenge.models.loan import utc_timestamp
+
+    assert loan_model.created_at <= utc_timestamp()
+    assert loan_model.created_at.endswith("Z")
+
+
+def test_idempotency_key_claim(mocker):
+    from botocore.exceptions import ClientError
+    from pynamodb.exceptions import PutError
+
+    from noverde_challenge.models.idempotency import IdempotencyKeyModel
+
+    record = IdempotencyKeyModel(key="foo", request_hash="bar")
+    assert record.in_progress
+    save = mocker.patch.object(IdempotencyKeyModel, "save")
+    get = mocker.patch.object(IdempotencyKeyModel, "get")
+    assert record.claim(60) is None
+    condition = str(save.call_args[1]["condition"])
+    assert "claimed_at" in condition
+    assert "expires_at <" in condition
+
+    error = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"
+    )
+    save.side_effect = PutError(cause=error)
+    assert record.claim(60) is get.return_value
+    assert get.call_args[1]["consistent_read"] is True
+
+    update = mocker.patch.object(IdempotencyKeyModel, "update")
+    record.complete("baz", 201)
+    paths = [action.values[0].path for action in update.call_args[1]["actions"]]
+    assert paths == [["loan_id"], ["status_code"]]
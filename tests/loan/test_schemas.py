@@ -1,3 +1,7 @@
+from copy import deepcopy
+
+import pytest
+
 from noverde_challenge.policies.stakeholders.noverde import NoverdePolicy
 from noverde_challenge.schemas.loan import LoanModelSchema
 
@@ -5,3 +9,102 @@ from noverde_challenge.schemas.loan import LoanModelSchema
 def test_policy_class_in_schema(loan_model):
     policy = LoanModelSchema()
     assert policy.policy_class == NoverdePolicy
+
+
+good_payload = {
+    "terms": 12,
+    "name": "Seu Madruga",
+    "cpf": "077.244.260-66",
+    "amount": 1000,
+    "birthdate": "1923-09-02",
+    "income": 2000.0,
+}
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        (None, None),
+        ("id", "873649aa-0851-41fe-9a42-6ca6d29ac3d2"),
+        ("cpf", "07724426066"),
+        ("amount", 4000.0),
+        ("terms", 6),
+    ],
+    ids=["Good Payload", "With Id", "CPF Without Mask", "Max Amount", "Min Terms"],
+)
+def test_fast_validate_matches_marshmallow(field, value):
+    payload = deepcopy(good_payload)
+    if field:
+        payload[field] = value
+    schema = LoanModelSchema()
+
+    fast = schema.fast_validate(payload)
+    expected = schema.load(payload)
+    assert fast.pop("loan_id") and expected.pop("loan_id")
+    assert fast == expected
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        ("terms", 5),
+        ("terms", 12.0),
+        ("terms", "12"),
+        ("cpf", "1234"),
+        ("cpf", "111.111.111-11"),
+        ("cpf", "077.244.260-67"),
+        ("amount", 15000),
+        ("amount", float("nan")),
+        ("amount", True),
+        ("birthdate", None),
+        ("birthdate", "2099-01-01"),
+        ("birthdate", "1923-02-30"),
+        ("birthdate", "02/09/1923"),
+        ("id", "foo"),
+        ("foo", "bar"),
+    ],
+)
+def test_fast_validate_falls_back(field, value):
+    payload = deepcopy(good_payload)
+    payload[field] = value
+    assert LoanModelSchema().fast_validate(payload) is None
+
+
+def test_create_schema_fallback_errors(mocker):
+    from marshmallow import ValidationError
+
+    from noverde_challenge.schemas.loan import CreateLoanModelSchema
+
+    payload = deepcopy(good_payload)
+    payload["cpf"] = "1234"
+    fast_validate = mocker.spy(CreateLoanModelSchema, "fast_validate")
+    with pytest.raises(ValidationError) as error:
+        CreateLoanModelSchema().load(payload)
+    assert fast_validate.called
+    assert error.value.messages == {"cpf": ["Invalid CPF number."]}
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("077.244.260-66", True),
+        ("07724426066", True),
+        ("077.244.260-67", False),
+        ("000.000.000-00", False),
+        ("1234", False),
+        ("077.244.260-66a", True),
+        ("a07724426066", True),
+        (" 077 244 260/66 ", True),
+        ("077.244.260--66", True),
+        ("077.244.260-660", False),
+        ("\uff10\uff17\uff17\uff12\uff14\uff14\uff12\uff16\uff10\uff16\uff16", False),
+        ("", False),
+    ],
+)
+def test_is_valid_cpf(value, expected):
+    # Fast path must match the installed validate_docbr (pinned in pyproject)
+    from validate_docbr import CPF
+
+    from noverde_challenge.utils.helpers import is_valid_cpf
+
+    assert is_valid_cpf(value) is expected is CPF().validate(value)
@@ -4,6 +4,7 @@ import arrow
 import pytest
 
 from noverde_challenge.handlers.analysis import (
+    analyze_loan,
     run_age_policy,
     run_commitment_policy,
     run_score_policy,
@@ -25,13 +26,16 @@ def test_run_age_policy(loan_model, mocker, age, expected_result, expected_statu
     test_loan = deepcopy(loan_model)
     test_loan.birthdate = arrow.utcnow().shift(years=age).format("YYYY-MM-DD")
     mocker.patch.object(LoanModel, "get", return_value=test_loan)
-    mocker.patch.object(LoanModel, "save")
+    mocker.patch.object(LoanModel, "update")
     event = {"loan_id": loan_model.loan_id}
     ret = run_age_policy(event, {})
+    assert "decision_trace" not in ret
+    assert test_loan.decision_trace["policies"] == {"age": expected_result is None}
     assert ret == {
         "loan_id": "873649aa-0851-41fe-9a42-6ca6d29ac3d2",
         "status": expected_status,
         "result": expected_result,
+        "external_values": {},
     }
 
 
@@ -51,14 +55,16 @@ def test_run_score_policy(
     requests_mock.post(url, json=response)
 
     mocker.patch.object(LoanModel, "get", return_value=loan_model)
-    mocker.patch.object(LoanModel, "save")
+    mocker.patch.object(LoanModel, "update")
 
     event = {"loan_id": loan_model.loan_id}
     ret = run_score_policy(event, {})
+    assert loan_model.decision_trace["score"] == score
     assert ret == {
         "loan_id": "873649aa-0851-41fe-9a42-6ca6d29ac3d2",
         "status": expected_status,
         "result": expected_result,
+        "external_values": {"score": score},
     }
 
 
@@ -101,22 +107,178 @@ def test_run_commitment_policy(
 ):
     test_loan = deepcopy(loan_model)
     mocker.patch.object(LoanModel, "get", return_value=test_loan)
-    mocker.patch.object(LoanModel, "save")
+    mocker.patch.object(LoanModel, "update")
 
     from noverde_challenge.policies.stakeholders.noverde import NoverdePolicy
 
     mocker.patch.object(NoverdePolicy, "request_score", return_value=600)
     mocker.patch.object(NoverdePolicy, "request_commitment", return_value=commitment)
 
-    from noverde_challenge.utils.rates import pandas
-
-    mocker.patch.object(pandas, "read_csv", return_value=test_rate_model)
-
     event = {"loan_id": loan_model.loan_id}
     ret = run_commitment_policy(event, {})
+    trace = test_loan.decision_trace
+    assert trace["commitment"] == commitment
+    assert trace.get("term") == expected_terms
     assert ret == {
         "loan_id": "873649aa-0851-41fe-9a42-6ca6d29ac3d2",
         "status": expected_status,
         "result": expected_result,
+        "external_values": {"score": 600, "commitment": commitment},
     }
     assert test_loan.allowed_terms == expected_terms
+
+
+def test_commitment_policy_reuses_score(
+    loan_model, mocker, requests_mock, test_rate_model
+):
+    test_loan = deepcopy(loan_model)
+    mocker.patch.object(LoanModel, "get", return_value=test_loan)
+    mocker.patch.object(LoanModel, "update")
+
+    score_url = f"{NoverdePolicy.request_base_url}score"
+    commitment_url = f"{NoverdePolicy.request_base_url}commitment"
+    score_mock = requests_mock.post(score_url, json={"score": 600})
+    requests_mock.post(commitment_url, json={"commitment": 0.5})
+
+    event = run_score_policy({"loan_id": loan_model.loan_id}, {})
+    ret = run_commitment_policy(event, {})
+    assert score_mock.call_count == 1
+    assert ret["external_values"] == {"score": 600, "commitment": 0.5}
+    assert ret["result"] == LoanAnalysisResult.APPROVED.value
+
+
+@pytest.mark.parametrize(
+    "age, score, commitment, expected_result, expected_refused_policy",
+    [
+        (-15, 800, 0.5, LoanAnalysisResult.REFUSED.value, "age"),
+        (-30, 200, 0.5, LoanAnalysisResult.REFUSED.value, "score"),
+        (-30, 600, 0.99, LoanAnalysisResult.REFUSED.value, "commitment"),
+        (-30, 600, 0.5, LoanAnalysisResult.APPROVED.value, None),
+    ],
+    ids=["Refused Age", "Refused Score", "Refused Commitment", "Approved"],
+)
+def test_analyze_loan(
+    loan_model,
+    mocker,
+    test_rate_model,
+    age,
+    score,
+    commitment,
+    expected_result,
+    expected_refused_policy,
+):
+    test_loan = deepcopy(loan_model)
+    test_loan.birthdate = arrow.utcnow().shift(years=age).format("YYYY-MM-DD")
+    get = mocker.patch.object(LoanModel, "get", return_value=test_loan)
+    save = mocker.patch.object(LoanModel, "update")
+
+    mocker.patch.object(NoverdePolicy, "request_score", return_value=score)
+    mocker.patch.object(NoverdePolicy, "request_commitment", return_value=commitment)
+
+    ret = analyze_loan({"loan_id": loan_model.loan_id}, {})
+    assert ret["status"] == LoanAnalysisStatus.COMPLETED.value
+    assert ret["result"] == expected_result
+    assert test_loan.refused_policy == expected_refused_policy
+    assert get.call_count == 1
+    assert save.call_count == 1
+
+
+def test_loan_state_in_payload(loan_model, mocker, monkeypatch, requests_mock):
+    monkeypatch.setenv("LOAN_STATE_IN_PAYLOAD", "true")
+    test_loan = deepcopy(loan_model)
+    test_loan.birthdate = arrow.utcnow().shift(years=-30).format("YYYY-MM-DD")
+    test_loan.version = 1
+    get = mocker.patch.object(LoanModel, "get", return_value=test_loan)
+    mocker.patch.object(LoanModel, "update")
+    requests_mock.post(f"{NoverdePolicy.request_base_url}score", json={"score": 800})
+
+    event = run_age_policy({"loan_id": loan_model.loan_id}, {})
+    assert event["loan"]["version"] == 1
+    assert get.call_count == 1
+
+    ret = run_score_policy(event, {})
+    assert get.call_count == 1
+    assert ret["status"] == LoanAnalysisStatus.PROCESSING.value
+    assert ret["loan"]["version"] == event["loan"]["version"]
+    assert ret["loan"]["decision_trace"]["score"] == 800
+
+
+def test_loan_state_in_payload_disabled(loan_model, mocker, monkeypatch):
+    monkeypatch.setenv("LOAN_STATE_IN_PAYLOAD", "false")
+    test_loan = deepcopy(loan_model)
+    test_loan.birthdate = arrow.utcnow().shift(years=-30).format("YYYY-MM-DD")
+    mocker.patch.object(LoanModel, "get", return_value=test_loan)
+    mocker.patch.object(LoanModel, "update")
+
+    ret = run_age_policy({"loan_id": loan_model.loan_id}, {})
+    assert "loan" not in ret
+
+
+def test_stale_loan_payload(loan_model, mocker):
+    from botocore.exceptions import ClientError
+    from pynamodb.exceptions import UpdateError
+
+    stale_loan = deepcopy(loan_model)
+    stale_loan.birthdate = arrow.utcnow().shift(years=-15).format("YYYY-MM-DD")
+    stale_loan.version = 1
+    current_loan = deepcopy(stale_loan)
+    current_loan.version = 2
+    current_loan.status = LoanAnalysisStatus.COMPLETED.value
+    current_loan.result = LoanAnalysisResult.REFUSED.value
+
+    error = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+    )
+    update = mocker.patch.object(
+        LoanModel, "update", side_effect=UpdateError(cause=error)
+    )
+    get = mocker.patch.object(LoanModel, "get", return_value=current_loan)
+
+    event = {"loan_id": loan_model.loan_id, "loan": stale_loan.to_payload()}
+    ret = run_age_policy(event, {})
+    get.assert_called_once_with(hash_key=loan_model.loan_id, consistent_read=True)
+    assert update.call_count == 1
+    assert ret["status"] == LoanAnalysisStatus.COMPLETED.value
+    assert ret["result"] == LoanAnalysisResult.REFUSED.value
+
+
+def test_retried_step_reuses_decision_trace(
+    loan_model, mocker, requests_mock, test_rate_model
+):
+    test_loan = deepcopy(loan_model)
+    mocker.patch.object(LoanModel, "get", return_value=test_loan)
+    update = mocker.patch.object(LoanModel, "update")
+
+    score_url = f"{NoverdePolicy.request_base_url}score"
+    commitment_url = f"{NoverdePolicy.request_base_url}commitment"
+    score_mock = requests_mock.post(score_url, json={"score": 600})
+    requests_mock.post(commitment_url, status_code=503)
+
+    with pytest.raises(Exception):
+        run_commitment_policy({"loan_id": loan_model.loan_id}, {})
+    assert score_mock.call_count == 1
+    assert update.call_count == 1
+    assert test_loan.decision_trace == {"score": 600}
+
+    requests_mock.post(commitment_url, json={"commitment": 0.5})
+    ret = run_commitment_policy({"loan_id": loan_model.loan_id}, {})
+    assert score_mock.call_count == 1
+    assert ret["result"] == LoanAnalysisResult.APPROVED.value
+    assert test_loan.decision_trace["policies"] == {"commitment": True}
+    assert test_loan.decision_trace["pmt"] == test_loan.allowed_amount
+
+
+def test_policy_timeout_from_context(loan_model, mocker, monkeypatch):
+    from noverde_challenge.utils.exceptions import PolicyTimeoutError
+
+    monkeypatch.setenv("POLICY_TIMEOUT_MARGIN", "1")
+    test_loan = deepcopy(loan_model)
+    mocker.patch.object(LoanModel, "get", return_value=test_loan)
+    mocker.patch.object(LoanModel, "update")
+    request_score = mocker.patch.object(NoverdePolicy, "request_score")
+
+    context = mocker.Mock()
+    context.get_remaining_time_in_millis.return_value = 500
+    with pytest.raises(PolicyTimeoutError):
+        run_score_policy({"loan_id": loan_model.loan_id}, context)
+    assert not request_score.called
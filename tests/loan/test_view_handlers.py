@@ -2,6 +2,7 @@ import json
 import uuid
 from copy import deepcopy
 
+import arrow
 import pytest
 from pynamodb.exceptions import DoesNotExist
 
@@ -36,6 +37,24 @@ def test_get(loan_model, mocker):
     }
 
 
+def test_get_trace(loan_model, mocker):
+    from noverde_challenge.handlers.loan import LoanModel, get_trace
+
+    loan_model.decision_trace = {"score": 700, "policies": {"score": True}}
+    get_loan = mocker.patch.object(LoanModel, "get", return_value=loan_model)
+    event = {"pathParameters": {"loan_id": loan_model.loan_id}}
+    response = get_trace(event, {})
+    assert response["statusCode"] == StatusCode.OK.value
+    assert json.loads(response["body"])["decision_trace"] == {
+        "score": 700,
+        "policies": {"score": True},
+    }
+    assert get_loan.call_args[1]["consistent_read"] is True
+
+    response = get(event, {})
+    assert "decision_trace" not in json.loads(response["body"])
+
+
 def test_get_not_found(mocker):
     from noverde_challenge.handlers.loan import LoanModel
 
@@ -74,17 +93,22 @@ def test_post(mocker):
     from noverde_challenge.schemas.loan import LoanModel
 
     mocker.patch.object(LoanModel, "save")
-    mocker.patch.object(LoanModel, "exists", return_value=False)
-    mocker.patch.object(LoanModel, "create_table")
-    moto = mocker.patch("noverde_challenge.handlers.loan.boto3")
+    mocker.patch.object(LoanModel, "find_by_cpf", return_value=[])
+    exists = mocker.patch.object(LoanModel, "exists", return_value=False)
+    create_table = mocker.patch.object(LoanModel, "create_table")
+    get_client = mocker.patch("noverde_challenge.handlers.loan.get_client")
 
     event = {"body": json.dumps(good_dog)}
     response = post(event, {})
     assert response["statusCode"] == StatusCode.CREATED.value
+    # Tables are created by migrations, never inside requests
+    assert not exists.called
+    assert not create_table.called
     response = json.loads(response["body"])
     uuid_value = response["id"]
     assert uuid.UUID(uuid_value)
-    moto.client.assert_called_with("stepfunctions")
+    get_client.assert_called_with("stepfunctions")
+    assert get_client.return_value.start_execution.called
 
 
 def test_internal_server_error():
@@ -94,3 +118,511 @@ def test_internal_server_error():
     assert (
         response["body"] == '{"error": ["Expecting value: line 1 column 1 (char 0)"]}'
     )
+
+
+def test_post_without_table(mocker):
+    from botocore.exceptions import ClientError
+    from pynamodb.exceptions import PutError
+
+    from noverde_challenge.schemas.loan import LoanModel
+
+    error = ClientError({"Error": {"Code": "ResourceNotFoundException"}}, "PutItem")
+    mocker.patch.object(LoanModel, "save", side_effect=PutError(cause=error))
+    mocker.patch.object(LoanModel, "find_by_cpf", return_value=[])
+    exists = mocker.patch.object(LoanModel, "exists")
+    create_table = mocker.patch.object(LoanModel, "create_table")
+
+    response = post({"body": json.dumps(good_dog)}, {})
+    assert response["statusCode"] == StatusCode.INTERNAL_ERROR.value
+    assert "does not exist" in response["body"]
+    assert not exists.called
+    assert not create_table.called
+
+
+def test_post_batch(mocker):
+    from noverde_challenge.handlers.loan import LoanModel, post_batch
+
+    batch_write = mocker.patch.object(LoanModel, "batch_write")
+    get_client = mocker.patch("noverde_challenge.handlers.loan.get_client")
+
+    bad_dog = deepcopy(good_dog)
+    bad_dog["terms"] = 5
+    items = [good_dog, bad_dog, dict(good_dog, id=str(uuid.uuid4())), "foo", good_dog]
+    response = post_batch({"body": json.dumps(items)}, {})
+    assert response["statusCode"] == StatusCode.CREATED.value
+    body = json.loads(response["body"])
+    assert len(body["ids"]) == 2
+    assert [error["index"] for error in body["errors"]] == [1, 2, 3]
+    assert body["errors"][0]["errors"] == ["terms: Terms must be one of [6, 9, 12]."]
+    assert body["errors"][1]["errors"] == ["id: Loan ids are generated by server."]
+    assert body["errors"][2]["errors"] == ["_schema: Invalid input type."]
+
+    saved = [
+        call[0][0]
+        for call in batch_write.return_value.__enter__.return_value.save.call_args_list
+    ]
+    assert [loan.loan_id for loan in saved] == body["ids"]
+    assert body["loans"] == [
+        {"index": 0, "id": body["ids"][0]},
+        {"index": 4, "id": body["ids"][1]},
+    ]
+    assert all(loan.version == 1 for loan in saved)
+    assert get_client.return_value.start_execution.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "body, error",
+    [
+        ({"foo": "bar"}, "non empty list"),
+        ([], "non empty list"),
+        ([{"name": "foo"}], "cpf: Missing data"),
+    ],
+    ids=["Not a List", "Empty List", "All Invalid"],
+)
+def test_invalid_post_batch(mocker, body, error):
+    from noverde_challenge.handlers.loan import LoanModel, post_batch
+
+    batch_write = mocker.patch.object(LoanModel, "batch_write")
+    response = post_batch({"body": json.dumps(body)}, {})
+    assert response["statusCode"] == StatusCode.BAD_REQUEST.value
+    assert error in response["body"]
+    assert not batch_write.called
+
+
+def test_post_batch_analysis_error(mocker):
+    from noverde_challenge.handlers.loan import LoanModel, post_batch
+
+    mocker.patch.object(LoanModel, "batch_write")
+    update = mocker.patch.object(LoanModel, "update")
+    get_client = mocker.patch("noverde_challenge.handlers.loan.get_client")
+    get_client.return_value.start_execution.side_effect = [None, Exception("Boom")]
+
+    response = post_batch({"body": json.dumps([good_dog, good_dog])}, {})
+    body = json.loads(response["body"])
+    assert len(body["ids"]) == 2
+    assert body["errors"] == [{"index": 1, "errors": ["analysis: Boom"]}]
+    assert update.call_count == 1
+    assert "ERROR" in str(update.call_args[1]["actions"][0])
+
+
+def test_post_batch_save_error(mocker):
+    from noverde_challenge.handlers.loan import LoanModel, post_batch
+
+    mocker.patch.object(
+        LoanModel,
+        "save_new_batch",
+        side_effect=lambda loans: {loans[0].loan_id: "Boom"},
+    )
+    get_client = mocker.patch("noverde_challenge.handlers.loan.get_client")
+
+    response = post_batch({"body": json.dumps([good_dog, good_dog])}, {})
+    assert response["statusCode"] == StatusCode.CREATED.value
+    body = json.loads(response["body"])
+    assert body["loans"] == [{"index": 1, "id": body["ids"][0]}]
+    assert body["errors"] == [{"index": 0, "errors": ["save: Boom"]}]
+    assert get_client.return_value.start_execution.call_count == 1
+
+    mocker.patch.object(
+        LoanModel,
+        "save_new_batch",
+        side_effect=lambda loans: {loan.loan_id: "Boom" for loan in loans},
+    )
+    response = post_batch({"body": json.dumps([good_dog])}, {})
+    assert response["statusCode"] == StatusCode.INTERNAL_ERROR.value
+    assert get_client.return_value.start_execution.call_count == 1
+
+
+def test_lookup(loan_model, mocker):
+    from noverde_challenge.handlers.loan import LoanModel, lookup
+
+    loan_id = loan_model.loan_id
+    batch_get = mocker.patch.object(LoanModel, "batch_get", return_value=[loan_model])
+    event = {"body": json.dumps({"ids": [loan_id, "foo", loan_id]})}
+    response = lookup(event, {})
+    assert response["statusCode"] == StatusCode.OK.value
+    assert json.loads(response["body"]) == {
+        "loans": [
+            {
+                "amount": None,
+                "id": loan_id,
+                "refused_policy": None,
+                "result": None,
+                "status": "processing",
+                "terms": None,
+            }
+        ],
+        "missing": ["foo"],
+    }
+    keys = batch_get.call_args[0][0]
+    assert keys == [loan_id, "foo"]
+    assert set(batch_get.call_args[1]["attributes_to_get"]) == {
+        "loan_id",
+        "status",
+        "result",
+        "refused_policy",
+        "allowed_amount",
+        "allowed_terms",
+    }
+
+
+@pytest.mark.parametrize(
+    "body", [{"ids": []}, {"ids": "foo"}, {"ids": [1]}, ["foo"], {"ids": [""]}]
+)
+def test_invalid_lookup(mocker, body):
+    from noverde_challenge.handlers.loan import LoanModel, lookup
+
+    batch_get = mocker.patch.object(LoanModel, "batch_get")
+    response = lookup({"body": json.dumps(body)}, {})
+    assert response["statusCode"] == StatusCode.BAD_REQUEST.value
+    assert not batch_get.called
+
+
+def test_get_completed_loan_is_cached(loan_model, mocker):
+    from noverde_challenge.handlers.loan import LoanModel
+
+    loan_model.status = "completed"
+    loan_model.result = "refused"
+    loan_model.refused_policy = "age"
+    get_item = mocker.patch.object(LoanModel, "get", return_value=loan_model)
+    event = {"pathParameters": {"loan_id": loan_model.loan_id}}
+
+    first = get(event, {})
+    second = get(event, {})
+    assert get_item.call_count == 1
+    assert first == second
+    assert first["headers"]["Cache-Control"].startswith("max-age=")
+    assert json.loads(first["body"])["refused_policy"] == "age"
+
+
+def test_get_processing_loan_is_not_cached(loan_model, mocker):
+    from noverde_challenge.handlers.loan import LoanModel
+
+    get_item = mocker.patch.object(LoanModel, "get", return_value=loan_model)
+    event = {"pathParameters": {"loan_id": loan_model.loan_id}}
+
+    response = get(event, {})
+    get(event, {})
+    assert get_item.call_count == 2
+    assert response["headers"]["Cache-Control"] == "no-cache"
+
+
+def test_get_not_modified(loan_model, mocker):
+    from noverde_challenge.handlers.loan import LoanModel
+
+    mocker.patch.object(LoanModel, "get", return_value=loan_model)
+    event = {"pathParameters": {"loan_id": loan_model.loan_id}}
+    etag = get(event, {})["headers"]["ETag"]
+
+    event["headers"] = {"if-none-match": etag}
+    response = get(event, {})
+    assert response["statusCode"] == StatusCode.NOT_MODIFIED.value
+    assert response["body"] == ""
+    assert response["headers"]["ETag"] == etag
+
+    event["headers"] = {"If-None-Match": '"foo"'}
+    assert get(event, {})["statusCode"] == StatusCode.OK.value
+
+
+def test_get_wait_for_decision(loan_model, mocker):
+    from noverde_challenge.handlers.loan import LoanModel
+
+    completed = deepcopy(loan_model)
+    completed.status = "completed"
+    completed.result = "approved"
+    get_item = mocker.patch.object(
+        LoanModel, "get", side_effect=[loan_model, deepcopy(loan_model), completed]
+    )
+    sleep = mocker.patch("noverde_challenge.handlers.loan.time.sleep")
+    event = {
+        "pathParameters": {"loan_id": loan_model.loan_id},
+        "queryStringParameters": {"wait": "10"},
+    }
+
+    response = get(event, {})
+    assert json.loads(response["body"])["status"] == "completed"
+    assert get_item.call_count == 3
+    assert get_item.call_args[1]["consistent_read"] is True
+    assert [call[0][0] for call in sleep.call_args_list] == [0.1, 0.2]
+
+
+def test_get_wait_expires(loan_model, mocker):
+    from noverde_challenge.handlers.loan import LoanModel
+
+    get_item = mocker.patch.object(LoanModel, "get", return_value=loan_model)
+    monotonic = mocker.patch("noverde_challenge.handlers.loan.time.monotonic")
+    monotonic.side_effect = [0.0, 0.0, 0.5, 1.0]
+    mocker.patch("noverde_challenge.handlers.loan.time.sleep")
+    event = {
+        "pathParameters": {"loan_id": loan_model.loan_id},
+        "queryStringParameters": {"wait": "1"},
+    }
+
+    response = get(event, {})
+    assert json.loads(response["body"])["status"] == "processing"
+    assert get_item.call_count == 3
+
+
+@pytest.mark.parametrize(
+    "wait, remaining, expected",
+    [
+        (None, 30000, 0.0),
+        ("5", 30000, 5.0),
+        ("-1", 30000, 0.0),
+        ("90", 30000, 20.0),
+        ("10", 3000, 2.0),
+    ],
+    ids=["No Wait", "Wait", "Negative", "Above Max", "Lambda Remaining Time"],
+)
+def test_get_wait_seconds(mocker, wait, remaining, expected):
+    from noverde_challenge.handlers.loan import get_wait_seconds
+
+    context = mocker.Mock()
+    context.get_remaining_time_in_millis.return_value = remaining
+    event = {"queryStringParameters": {"wait": wait} if wait else None}
+    assert get_wait_seconds(event, context) == expected
+
+
+@pytest.mark.parametrize("wait", ["foo", "nan"])
+def test_get_invalid_wait(loan_model, wait):
+    event = {
+        "pathParameters": {"loan_id": loan_model.loan_id},
+        "queryStringParameters": {"wait": wait},
+    }
+    response = get(event, {})
+    assert response["statusCode"] == StatusCode.BAD_REQUEST.value
+
+
+@pytest.mark.parametrize(
+    "status, field, value, duplicated",
+    [
+        ("processing", None, None, True),
+        ("completed", None, None, True),
+        ("ERROR", None, None, False),
+        ("processing", "amount", 2000.0, False),
+    ],
+    ids=["In Analysis", "Decided", "Error", "Other Application"],
+)
+def test_post_duplicated_application(
+    loan_model, mocker, status, field, value, duplicated
+):
+    from noverde_challenge.handlers.loan import LoanModel
+
+    existing = deepcopy(loan_model)
+    existing.cpf = "07724426066"
+    existing.amount = good_dog["amount"]
+    existing.terms = good_dog["terms"]
+    existing.income = good_dog["income"]
+    existing.status = status
+    if field:
+        setattr(existing, field, value)
+    find_by_cpf = mocker.patch.object(LoanModel, "find_by_cpf", return_value=[existing])
+    save = mocker.patch.object(LoanModel, "save")
+    get_client = mocker.patch("noverde_challenge.handlers.loan.get_client")
+
+    response = post({"body": json.dumps(good_dog)}, {})
+    assert find_by_cpf.call_args[0][0] == "07724426066"
+    if duplicated:
+        assert response["statusCode"] == StatusCode.OK.value
+        assert json.loads(response["body"]) == {"id": existing.loan_id}
+        assert not save.called
+        assert not get_client.return_value.start_execution.called
+    else:
+        assert response["statusCode"] == StatusCode.CREATED.value
+        assert save.called
+        assert get_client.return_value.start_execution.called
+
+
+def test_list_by_cpf(loan_model, mocker):
+    from noverde_challenge.handlers.loan import LoanModel, list_by_cpf
+
+    find_by_cpf = mocker.patch.object(
+        LoanModel, "find_by_cpf", return_value=[loan_model]
+    )
+    event = {"queryStringParameters": {"cpf": "077.244.260-66"}}
+    response = list_by_cpf(event, {})
+    assert response["statusCode"] == StatusCode.OK.value
+    assert json.loads(response["body"])["loans"][0]["id"] == loan_model.loan_id
+    assert find_by_cpf.call_args[0][0] == "07724426066"
+
+    response = list_by_cpf({"queryStringParameters": None}, {})
+    assert response["statusCode"] == StatusCode.BAD_REQUEST.value
+
+
+@pytest.fixture
+def post_mocks(mocker):
+    from noverde_challenge.handlers.loan import IdempotencyKeyModel, LoanModel
+
+    mocks = mocker.Mock()
+    mocks.save = mocker.patch.object(LoanModel, "save")
+    mocker.patch.object(LoanModel, "find_by_cpf", return_value=[])
+    mocks.claim = mocker.patch.object(IdempotencyKeyModel, "claim", return_value=None)
+    mocks.delete = mocker.patch.object(IdempotencyKeyModel, "delete")
+    mocks.complete = mocker.patch.object(IdempotencyKeyModel, "complete")
+    mocks.get_client = mocker.patch("noverde_challenge.handlers.loan.get_client")
+    return mocks
+
+
+def test_post_idempotency_key(post_mocks):
+    from noverde_challenge.handlers.loan import execution_name
+
+    event = {"headers": {"Idempotency-Key": "foo"}, "body": json.dumps(good_dog)}
+    response = post(event, {})
+    assert response["statusCode"] == StatusCode.CREATED.value
+    assert post_mocks.claim.called
+    loan_id = json.loads(response["body"])["id"]
+    post_mocks.complete.assert_called_once_with(loan_id, StatusCode.CREATED.value)
+    start_execution = post_mocks.get_client.return_value.start_execution
+    assert start_execution.call_args[1]["name"] == execution_name(loan_id)
+    assert len(execution_name(loan_id)) <= 80
+
+
+def test_post_idempotency_key_replay(post_mocks):
+    import hashlib
+
+    from noverde_challenge.handlers.loan import IdempotencyKeyModel
+
+    request_hash = hashlib.sha256(
+        json.dumps(good_dog, sort_keys=True).encode()
+    ).hexdigest()
+    post_mocks.claim.return_value = IdempotencyKeyModel(
+        key="foo", request_hash=request_hash, loan_id="bar", status_code=201
+    )
+
+    event = {"headers": {"idempotency-key": "foo"}, "body": json.dumps(good_dog)}
+    response = post(event, {})
+    assert response["statusCode"] == StatusCode.CREATED.value
+    assert json.loads(response["body"]) == {"id": "bar"}
+    assert not post_mocks.save.called
+    assert not post_mocks.get_client.return_value.start_execution.called
+
+    event["body"] = json.dumps(dict(good_dog, amount=2000.0))
+    response = post(event, {})
+    assert response["statusCode"] == StatusCode.CONFLICT.value
+    assert not post_mocks.save.called
+
+
+def test_post_idempotency_key_in_progress(post_mocks):
+    import hashlib
+
+    from noverde_challenge.handlers.loan import IdempotencyKeyModel
+
+    request_hash = hashlib.sha256(
+        json.dumps(good_dog, sort_keys=True).encode()
+    ).hexdigest()
+    post_mocks.claim.return_value = IdempotencyKeyModel(
+        key="foo", request_hash=request_hash
+    )
+
+    event = {"headers": {"Idempotency-Key": "foo"}, "body": json.dumps(good_dog)}
+    response = post(event, {})
+    assert response["statusCode"] == StatusCode.CONFLICT.value
+    assert response["headers"]["Retry-After"] == "1"
+    assert "in progress" in response["body"]
+    assert not post_mocks.save.called
+    assert not post_mocks.delete.called
+
+
+def test_post_idempotency_key_released_on_error(post_mocks, mocker):
+    from noverde_challenge.handlers.loan import LoanModel
+
+    mocker.patch.object(LoanModel, "update")
+    post_mocks.get_client.return_value.start_execution.side_effect = Exception("Boom")
+    event = {"headers": {"Idempotency-Key": "foo"}, "body": json.dumps(good_dog)}
+    response = post(event, {})
+    assert response["statusCode"] == StatusCode.INTERNAL_ERROR.value
+    assert post_mocks.delete.called
+    assert not post_mocks.complete.called
+
+
+def test_post_analysis_error_is_not_duplicated(post_mocks, mocker):
+    from noverde_challenge.handlers.loan import LoanAnalysisStatus, LoanModel
+
+    save_new = mocker.patch.object(LoanModel, "save_new", autospec=True)
+    update = mocker.patch.object(LoanModel, "update")
+    start_execution = post_mocks.get_client.return_value.start_execution
+    start_execution.side_effect = Exception("Boom")
+    response = post({"body": json.dumps(good_dog)}, {})
+    assert response["statusCode"] == StatusCode.INTERNAL_ERROR.value
+    orphan = save_new.call_args[0][0]
+    assert orphan.status == LoanAnalysisStatus.ERROR.value
+    assert update.called
+
+    mocker.patch.object(LoanModel, "find_by_cpf", return_value=[orphan])
+    start_execution.side_effect = None
+    response = post({"body": json.dumps(good_dog)}, {})
+    assert response["statusCode"] == StatusCode.CREATED.value
+
+    orphan.status = LoanAnalysisStatus.PROCESSING.value
+    response = post({"body": json.dumps(good_dog)}, {})
+    assert response["statusCode"] == StatusCode.OK.value
+
+
+def test_post_invalid_idempotency_key(post_mocks):
+    event = {"headers": {"Idempotency-Key": ""}, "body": json.dumps(good_dog)}
+    response = post(event, {})
+    assert response["statusCode"] == StatusCode.BAD_REQUEST.value
+    assert not post_mocks.claim.called
+
+
+def test_post_pre_screen_refused(post_mocks, mocker):
+    from noverde_challenge.handlers.loan import LoanModel
+
+    minor_dog = dict(
+        good_dog, birthdate=arrow.utcnow().shift(years=-15).format("YYYY-MM-DD")
+    )
+    save = mocker.spy(LoanModel, "save_new")
+    response = post({"body": json.dumps(minor_dog)}, {})
+    assert response["statusCode"] == StatusCode.CREATED.value
+    loan = save.call_args[0][0]
+    assert loan.status == "completed"
+    assert loan.result == "refused"
+    assert loan.refused_policy == "age"
+    assert not post_mocks.get_client.return_value.start_execution.called
+
+
+def test_post_pre_screen_disabled(post_mocks, mocker):
+    mocker.patch("noverde_challenge.handlers.loan.PRE_SCREEN_POLICIES", ())
+    minor_dog = dict(
+        good_dog, birthdate=arrow.utcnow().shift(years=-15).format("YYYY-MM-DD")
+    )
+    response = post({"body": json.dumps(minor_dog)}, {})
+    assert response["statusCode"] == StatusCode.CREATED.value
+    assert post_mocks.get_client.return_value.start_execution.called
+
+
+def test_post_batch_pre_screen(mocker):
+    from noverde_challenge.handlers.loan import LoanModel, post_batch
+
+    mocker.patch.object(LoanModel, "batch_write")
+    get_client = mocker.patch("noverde_challenge.handlers.loan.get_client")
+    minor_dog = dict(
+        good_dog, birthdate=arrow.utcnow().shift(years=-15).format("YYYY-MM-DD")
+    )
+
+    response = post_batch({"body": json.dumps([minor_dog, good_dog])}, {})
+    body = json.loads(response["body"])
+    assert len(body["ids"]) == 2
+    assert body["errors"] == []
+    assert get_client.return_value.start_execution.call_count == 1
+
+
+def test_pre_screen_policies_config(monkeypatch):
+    from noverde_challenge.handlers.loan import (
+        LoanRefusedPolicy,
+        load_pre_screen_policies,
+        parse_policies,
+    )
+    from noverde_challenge.utils.exceptions import ConfigurationError
+
+    assert parse_policies(" age, score ,") == (
+        LoanRefusedPolicy.AGE,
+        LoanRefusedPolicy.SCORE,
+    )
+    with pytest.raises(ConfigurationError) as error:
+        parse_policies("age,agee")
+    assert "agee" in str(error.value)
+
+    monkeypatch.setenv("LOAN_PRE_SCREEN_POLICIES", "agee")
+    assert load_pre_screen_policies() == ()
+    monkeypatch.setenv("LOAN_PRE_SCREEN_POLICIES", "")
+    assert load_pre_screen_policies() == ()
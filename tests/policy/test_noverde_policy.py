@@ -70,7 +70,6 @@ def test_terms_policy(loan_model, value, result):
 )
 def test_commitment_policy(loan_model, value, result, mocker, test_rate_model):
     from noverde_challenge.policies.stakeholders.noverde import NoverdePolicy
-    from noverde_challenge.utils.rates import pandas
     from noverde_challenge.models.loan import LoanModel
 
     test_model = deepcopy(loan_model)
@@ -78,9 +77,8 @@ def test_commitment_policy(loan_model, value, result, mocker, test_rate_model):
 
     mocker.patch.object(NoverdePolicy, "request_score", return_value=value)
     mocker.patch.object(NoverdePolicy, "request_commitment", return_value=0.8)
-    mocker.patch.object(pandas, "read_csv", return_value=test_rate_model)
     mocker.patch.object(LoanModel, "get", return_value=test_model)
-    mocker.patch.object(LoanModel, "save")
+    mocker.patch.object(LoanModel, "update")
 
     policy = NoverdePolicy(loan=test_model)
     assert policy.run_commitment_policy() == result
@@ -91,3 +89,215 @@ def test_calculate_pmt():
         present_value=5000, rate_interest=0.15, number_period=12
     )
     assert pmt == 922.40
+
+
+def test_calculate_pmts():
+    rates = [0.08, 0.085, 0.15]
+    terms = [6, 9, 12]
+    pmts = NoverdePolicy.calculate_pmts(
+        present_value=5000, rates_interest=rates, number_periods=terms
+    )
+    assert pmts.tolist() == [
+        NoverdePolicy.calculate_pmt(5000, rate, term)
+        for rate, term in zip(rates, terms)
+    ]
+
+
+def test_analyze_batch(loan_model, mocker, test_rate_model):
+    from noverde_challenge.models.loan import LoanModel
+    from noverde_challenge.policies.batch import LoanBatch
+
+    mocker.patch.object(LoanModel, "update")
+
+    cases = [
+        # (age, score, commitment, income, terms)
+        (15, 800, 0.5, 2000.0, 9),
+        (30, 200, 0.5, 2000.0, 9),
+        (30, 850, 0.99, 2000.0, 9),
+        (30, 600, 0.5, 1500.0, 9),
+        (30, 600, 0.7, 1500.0, 6),
+        (30, 1200, 0.8, 2000.0, 12),
+    ]
+    loans, scores, commitments, expected = [], [], [], []
+    for index, (age, score, commitment, income, terms) in enumerate(cases):
+        test_loan = deepcopy(loan_model)
+        test_loan.loan_id = str(index)
+        test_loan.birthdate = arrow.utcnow().shift(years=-age).format("YYYY-MM-DD")
+        test_loan.income = income
+        test_loan.terms = terms
+        loans.append(test_loan)
+        scores.append(score)
+        commitments.append(commitment)
+
+        single_loan = deepcopy(test_loan)
+        mocker.patch.object(NoverdePolicy, "request_score", return_value=score)
+        mocker.patch.object(
+            NoverdePolicy, "request_commitment", return_value=commitment
+        )
+        policy = NoverdePolicy(loan=single_loan)
+        for refused_policy, run_policy in [
+            ("age", policy.run_age_policy),
+            ("score", policy.run_score_policy),
+            ("commitment", policy.run_commitment_policy),
+        ]:
+            if not run_policy():
+                single_loan.refused_policy = refused_policy
+                single_loan.result = "refused"
+                break
+        expected.append(
+            {
+                "loan_id": single_loan.loan_id,
+                "status": "completed",
+                "result": single_loan.result,
+                "refused_policy": single_loan.refused_policy,
+                "allowed_amount": single_loan.allowed_amount,
+                "allowed_terms": single_loan.allowed_terms,
+            }
+        )
+
+    batch = LoanBatch.from_loans(loans, scores=scores, commitments=commitments)
+    results = NoverdePolicy.analyze_batch(batch)
+    assert results.to_records() == expected
+    assert [record["result"] for record in expected].count("approved") == 3
+
+
+def test_request_external_values(loan_model, requests_mock):
+    policy = NoverdePolicy(loan=loan_model, external_values={"score": 700})
+    score_url = f"{policy.request_base_url}score"
+    commitment_url = f"{policy.request_base_url}commitment"
+    score_mock = requests_mock.post(score_url, json={"score": 800})
+    requests_mock.post(commitment_url, json={"commitment": 0.8})
+    values = policy.request_external_values("commitment", "score")
+    assert values == {"commitment": 0.8, "score": 700}
+    assert not score_mock.called
+    assert policy.saved_requests == 1
+
+
+def test_request_external_values_timeout(loan_model, mocker):
+    import time
+
+    from noverde_challenge.utils.exceptions import PolicyTimeoutError
+
+    def request_score():
+        time.sleep(0.2)
+        return 700
+
+    mocker.patch.object(NoverdePolicy, "request_score", side_effect=request_score)
+    mocker.patch.object(NoverdePolicy, "request_commitment", return_value=0.8)
+    policy = NoverdePolicy(loan=loan_model, request_timeout=0.05)
+    with pytest.raises(PolicyTimeoutError):
+        policy.request_external_values("commitment", "score")
+
+    # Finished requests are kept, abandoned ones never change state
+    time.sleep(0.3)
+    assert policy.external_values == {"commitment": 0.8}
+    assert loan_model.decision_trace == {"commitment": 0.8}
+
+
+@pytest.fixture
+def slow_stakeholder():
+    """Local Stakeholder API answering score after `server.delay` seconds."""
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class SlowHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            time.sleep(self.server.delay)
+            body = json.dumps({"score": 800}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    server.delay = 1
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_timeout_from_time_budget(loan_model, slow_stakeholder):
+    import time
+
+    from noverde_challenge.utils.exceptions import PolicyTimeoutError
+
+    policy = NoverdePolicy(loan=loan_model, time_budget=2)
+    assert 1 < policy.get_request_timeout() <= 2
+
+    # Goes through the pooled Session adapter and its retries,
+    # which report read timeouts as ConnectionError.
+    policy = NoverdePolicy(loan=loan_model, time_budget=0.6)
+    policy.request_base_url = f"http://127.0.0.1:{slow_stakeholder.server_port}/"
+    started = time.monotonic()
+    with pytest.raises(PolicyTimeoutError):
+        policy.request_score()
+    assert time.monotonic() - started < 0.9
+
+    policy = NoverdePolicy(loan=loan_model, time_budget=0)
+    with pytest.raises(PolicyTimeoutError):
+        policy.request_external_values("score")
+
+
+def test_request_read_uses_whole_timeout(loan_model, slow_stakeholder, monkeypatch):
+    monkeypatch.setenv("HTTP_MAX_RETRIES", "2")
+    slow_stakeholder.delay = 0.5
+    # Slower than timeout / (retries + 1), faster than timeout.
+    policy = NoverdePolicy(loan=loan_model, request_timeout=0.9)
+    policy.request_base_url = f"http://127.0.0.1:{slow_stakeholder.server_port}/"
+    assert policy.request_score() == 800
+
+
+def test_score_policy_async(loan_model, mocker):
+    import asyncio
+    import time
+
+    from noverde_challenge.utils.aio import gather_bounded
+
+    def request_score():
+        time.sleep(0.05)
+        return 700
+
+    mocker.patch.object(NoverdePolicy, "request_score", side_effect=request_score)
+    policies = [NoverdePolicy(loan=deepcopy(loan_model)) for _ in range(8)]
+    start = time.monotonic()
+    results = asyncio.run(
+        gather_bounded((policy.run_score_policy_async() for policy in policies), 8)
+    )
+    assert results == [True] * 8
+    assert time.monotonic() - start < 0.05 * 4
+
+
+def test_run_pre_screen(loan_model, mocker):
+    from noverde_challenge.models.loan import LoanRefusedPolicy
+
+    policy = NoverdePolicy(loan=loan_model)
+    run_score_policy = mocker.patch.object(NoverdePolicy, "run_score_policy")
+    assert policy.run_pre_screen([LoanRefusedPolicy.SCORE]) is None
+    assert not run_score_policy.called
+
+    policy.loan.birthdate = arrow.utcnow().shift(years=-15).format("YYYY-MM-DD")
+    assert policy.run_pre_screen(policy.local_policies) == LoanRefusedPolicy.AGE
+
+
+def test_sync_policies_inside_running_loop(loan_model, mocker):
+    import asyncio
+
+    mocker.patch.object(NoverdePolicy, "request_score", return_value=700)
+    get_executor = mocker.patch(
+        "noverde_challenge.policies.stakeholders.noverde.get_executor"
+    )
+    policy = NoverdePolicy(loan=deepcopy(loan_model))
+
+    async def run_policy():
+        return policy.run_score_policy()
+
+    assert asyncio.run(run_policy()) is True
+    assert not get_executor.called
@@ -1,8 +1,10 @@
 import pytest
 
-from noverde_challenge import __version__, configure_sentry, set_remote_debug
+from noverde_challenge import __version__
+from noverde_challenge.utils.debug import set_remote_debug
 from noverde_challenge.utils.helpers import only_numbers
 from noverde_challenge.utils.secrets import get_secret
+from noverde_challenge.utils.sentry import configure_sentry
 from noverde_challenge.utils.status_code import StatusCode
 
 
@@ -18,6 +20,8 @@ def test_version():
         ("CREATED", 201),
         ("INTERNAL_ERROR", 500),
         ("NOT_FOUND", 404),
+        ("NOT_MODIFIED", 304),
+        ("CONFLICT", 409),
     ],
 )
 def test_status_code(name, value):
@@ -35,6 +39,22 @@ def test_do_not_start_remote_debug(monkeypatch):
     assert not set_remote_debug()
 
 
+def test_start_remote_debug_is_opt_in(mocker, monkeypatch):
+    monkeypatch.delenv("PYCHARM_REMOTE_DEBUG", raising=False)
+    pydevd_pycharm = mocker.Mock()
+    mocker.patch.dict("sys.modules", {"pydevd_pycharm": pydevd_pycharm})
+    assert not set_remote_debug()
+    assert not pydevd_pycharm.settrace.called
+
+    monkeypatch.setenv("PYCHARM_REMOTE_DEBUG", "false")
+    assert not set_remote_debug()
+    assert not pydevd_pycharm.settrace.called
+
+    monkeypatch.setenv("PYCHARM_REMOTE_DEBUG", "true")
+    assert set_remote_debug()
+    assert pydevd_pycharm.settrace.called
+
+
 def test_do_not_start_sentry(monkeypatch):
     monkeypatch.delenv("SENTRY_DSN", raising=False)
     assert not configure_sentry()
@@ -43,3 +63,229 @@ def test_do_not_start_sentry(monkeypatch):
 def test_only_numbers():
     test = ".+@abcd123&45efgh67_=-"
     assert only_numbers(test) == "1234567"
+
+
+def test_rate_model_is_cached(mocker, test_rate_model):
+    from noverde_challenge.utils import rates
+
+    read_rate_table = mocker.patch.object(
+        rates, "read_rate_table", wraps=rates.read_rate_table
+    )
+    first = rates.get_rates(750, 9, [6, 9, 12], "noverde_rate_model")
+    second = rates.get_rates(750, 9, [6, 9, 12], "noverde_rate_model")
+    assert read_rate_table.call_count == 1
+    assert first == second == ((9, 0.070), (12, 0.075))
+
+
+@pytest.mark.parametrize(
+    "score, expected",
+    [(590, ()), (600, ((6, 0.080), (12, 0.090))), (1200, ((6, 0.035), (12, 0.045)))],
+    ids=["Below Min Score", "Min Score", "Above Max Score"],
+)
+def test_rate_model_lookup(mocker, test_rate_model, score, expected):
+    from noverde_challenge.utils.rates import get_rate_model
+
+    rate_model = get_rate_model("noverde_rate_model")
+    assert rate_model.lookup(score, 6, [6, 12]) == expected
+
+
+def test_rate_model_reload(mocker, test_rate_model):
+    from noverde_challenge.utils import rates
+    from noverde_challenge.utils.rates import (
+        RateModel,
+        get_rate_model,
+        invalidate_rate_models,
+        reload_rate_model,
+    )
+
+    read_rate_table = mocker.patch.object(
+        rates, "read_rate_table", wraps=rates.read_rate_table
+    )
+    rate_model = get_rate_model("noverde_rate_model")
+    assert reload_rate_model("noverde_rate_model") is not rate_model
+    invalidate_rate_models("noverde_rate_model")
+    get_rate_model("noverde_rate_model")
+    assert read_rate_table.call_count == 3
+
+    mocker.patch.object(RateModel, "is_stale", True)
+    get_rate_model("noverde_rate_model")
+    assert read_rate_table.call_count == 3
+    get_rate_model("noverde_rate_model", check_mtime=True)
+    assert read_rate_table.call_count == 4
+
+
+@pytest.mark.parametrize(
+    "value, expected", [("1", True), ("True", True), ("0", False), ("false", False)]
+)
+def test_env_flag(monkeypatch, value, expected):
+    from noverde_challenge.utils.helpers import env_flag
+
+    monkeypatch.setenv("RATE_MODEL_CHECK_MTIME", value)
+    assert env_flag("RATE_MODEL_CHECK_MTIME") is expected
+    monkeypatch.setenv("RATE_MODEL_CHECK_MTIME", "maybe")
+    with pytest.raises(ValueError):
+        env_flag("RATE_MODEL_CHECK_MTIME")
+
+
+def test_rate_model_to_dataframe(test_rate_model):
+    pytest.importorskip("pandas")
+    from noverde_challenge.utils.rates import get_rate_model
+
+    df = get_rate_model("noverde_rate_model").to_dataframe()
+    assert df.loc[700, "9"] == 0.070
+    assert list(df.columns) == ["6", "9", "12"]
+
+
+def test_get_cached_secret(monkeypatch):
+    from noverde_challenge.utils.secrets import clear_cached_secrets, get_cached_secret
+
+    clear_cached_secrets()
+    monkeypatch.delenv("NOVERDE_API_TOKEN", raising=False)
+    assert get_cached_secret("/noverde/api/token") is None
+    monkeypatch.setenv("NOVERDE_API_TOKEN", "FOOBar")
+    assert get_cached_secret("/noverde/api/token") == "FOOBar"
+    monkeypatch.setenv("NOVERDE_API_TOKEN", "BarFOO")
+    assert get_cached_secret("/noverde/api/token") == "FOOBar"
+    clear_cached_secrets()
+
+
+def test_get_http_session(monkeypatch):
+    from noverde_challenge.utils.http import get_http_session
+
+    get_http_session.cache_clear()
+    monkeypatch.setenv("HTTP_POOL_SIZE", "4")
+    monkeypatch.setenv("HTTP_MAX_RETRIES", "3")
+    session = get_http_session()
+    assert get_http_session() is session
+    adapter = session.get_adapter("https://challenge.noverde.name/")
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 3
+    assert adapter.max_retries.connect == 3
+    assert adapter.max_retries.read == 0
+    assert adapter.max_retries.is_retry("POST", 503)
+    get_http_session.cache_clear()
+
+
+def test_get_retry_methods(monkeypatch):
+    from noverde_challenge.utils.http import Retry, get_retry_methods
+
+    monkeypatch.delattr(Retry, "DEFAULT_ALLOWED_METHODS", raising=False)
+    assert set(get_retry_methods()) == {"method_whitelist"}
+    monkeypatch.setattr(Retry, "DEFAULT_ALLOWED_METHODS", frozenset(), raising=False)
+    assert get_retry_methods() == {"allowed_methods": frozenset(["GET", "POST"])}
+
+
+def test_get_client(mocker, monkeypatch):
+    from noverde_challenge.utils.aws import get_client
+
+    get_client.cache_clear()
+    monkeypatch.setenv("AWS_MAX_POOL_CONNECTIONS", "4")
+    client = mocker.patch("boto3.client")
+    assert get_client("stepfunctions") is get_client("stepfunctions")
+    assert client.call_count == 1
+    config = client.call_args[1]["config"]
+    assert config.max_pool_connections == 4
+    get_client.cache_clear()
+
+
+def test_warm_up(mocker, monkeypatch):
+    from noverde_challenge.models.loan import LoanModel
+    from noverde_challenge.utils.aws import warm_up
+
+    get_client = mocker.patch("noverde_challenge.utils.aws.get_client")
+    get_connection = mocker.patch.object(LoanModel, "_get_connection")
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    assert not warm_up(clients=["stepfunctions"], models=[LoanModel])
+    assert not get_client.called
+
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "CreateLoan")
+    assert warm_up(clients=["stepfunctions"], models=[LoanModel])
+    get_client.assert_called_with("stepfunctions")
+    assert get_connection.called
+
+
+@pytest.mark.parametrize(
+    "module, forbidden",
+    [
+        (
+            "noverde_challenge.handlers.loan",
+            ["pandas", "numpy", "numpy_financial", "pydevd_pycharm", "sentry_sdk"],
+        ),
+        ("noverde_challenge.handlers.analysis", ["pandas", "pydevd_pycharm"]),
+    ],
+)
+def test_handler_import_footprint(module, forbidden):
+    import subprocess
+    import sys
+
+    code = f"import sys, {module}; print(','.join(sorted(sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    loaded = set(output.stdout.strip().split(","))
+    assert not loaded.intersection(forbidden)
+
+
+def test_handler_view_keeps_encoded_body():
+    from noverde_challenge.utils.handler_view import handler_view
+
+    @handler_view()
+    def view(event, context):
+        return {"statusCode": StatusCode.OK, "body": '{"id": "foo"}'}
+
+    assert view({}, {}) == {"statusCode": 200, "body": '{"id": "foo"}'}
+
+
+def test_get_schema_is_shared():
+    from noverde_challenge.schemas.loan import RetrieveLoanModelSchema, get_schema
+
+    assert get_schema(RetrieveLoanModelSchema) is get_schema(RetrieveLoanModelSchema)
+
+
+def test_ttl_cache(mocker):
+    from noverde_challenge.utils.cache import TTLCache
+
+    monotonic = mocker.patch("noverde_challenge.utils.cache.time.monotonic")
+    monotonic.return_value = 100.0
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    monotonic.return_value = 110.0
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+@pytest.mark.parametrize(
+    "if_none_match, expected",
+    [
+        (None, False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"foo", "abc"', True),
+        ("*", True),
+        ('"foo"', False),
+    ],
+)
+def test_etag_matches(if_none_match, expected):
+    from noverde_challenge.utils.handler_view import etag_matches
+
+    assert etag_matches('"abc"', if_none_match) is expected
+
+
+def test_is_timeout():
+    from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+    from urllib3.exceptions import MaxRetryError, ReadTimeoutError
+
+    from noverde_challenge.utils.http import is_timeout
+
+    read_timeout = ReadTimeoutError(None, "/score", "Read timed out.")
+    assert is_timeout(ReadTimeout())
+    assert is_timeout(ConnectTimeout())
+    assert is_timeout(ConnectionError(MaxRetryError(None, "/score", read_timeout)))
+    assert not is_timeout(ConnectionError(MaxRetryError(None, "/score", None)))
+    assert not is_timeout(ConnectionError())